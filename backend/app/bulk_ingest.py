@@ -0,0 +1,378 @@
+"""Bulk ingest of a directory, archive or NDJSON file of documents.
+
+Usage: python -m app.bulk_ingest <path> --org-id 1 [--sensitivity 5]
+       [--acl-roles employee,manager] [--workers 4]
+
+Files are parsed, chunked and embedded in a process pool; chunks are
+indexed in large batches, one transaction per batch.
+
+The CLI writes INDEX_DIR and the database directly, so it refuses to run
+while the server is up; upload to /documents/ingest/bulk instead.
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import sys
+import tarfile
+import time
+import uuid
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+from app.config import settings
+from app.db import (
+    claim_documents,
+    forget_documents,
+    init_db,
+    mark_documents_indexed,
+)
+from app.docs_db import iter_pdf_pages, iter_text_blocks
+from app.safe_faiss import SafeFAISS
+from app.services.embedding_cache import chunk_and_embed, normalize_text
+
+TEXT_EXTENSIONS = (".txt", ".md")
+NDJSON_EXTENSIONS = (".ndjson", ".jsonl")
+SUPPORTED_EXTENSIONS = TEXT_EXTENSIONS + (".pdf",)
+READ_AHEAD_PER_WORKER = 4  # Documents parsed ahead of indexing, per worker
+
+# A source is (name, data): a file path, or the raw bytes of a document, or
+# the error that kept it from being read
+Source = Tuple[str, Union[str, bytes, Exception]]
+
+
+def _supported(name: str) -> bool:
+    return os.path.splitext(name)[1].lower() in SUPPORTED_EXTENSIONS
+
+
+def _iter_ndjson(path: str) -> Iterator[Source]:
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line_no, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            name = f"{path}:{line_no}"
+            try:
+                record = json.loads(line)
+                name = record.get("title") or name
+                data = record["content"].encode("utf-8")
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                data = ValueError(f"Invalid NDJSON record: {e!r}")
+            yield name, data
+
+
+def _iter_zip(path: str) -> Iterator[Source]:
+    with zipfile.ZipFile(path) as archive:
+        for member in archive.infolist():
+            if not member.is_dir() and _supported(member.filename):
+                try:
+                    data = archive.read(member)
+                except Exception as e:
+                    data = e
+                yield member.filename, data
+
+
+def _iter_tar(path: str) -> Iterator[Source]:
+    with tarfile.open(path) as archive:
+        for member in archive:
+            if member.isfile() and _supported(member.name):
+                try:
+                    data = archive.extractfile(member).read()
+                except Exception as e:
+                    data = e
+                yield member.name, data
+
+
+def _source_reader(path: str) -> Optional[Callable[[str], Iterator[Source]]]:
+    """The reader of an NDJSON file or archive; None for a single document"""
+    if path.lower().endswith(NDJSON_EXTENSIONS):
+        return _iter_ndjson
+    if zipfile.is_zipfile(path):
+        return _iter_zip
+    if tarfile.is_tarfile(path):
+        return _iter_tar
+    return None
+
+
+def iter_sources(path: str) -> Iterator[Source]:
+    """Walk a directory, archive or NDJSON file, one document at a time.
+
+    Archive members and NDJSON lines are read in order, so only the
+    document being yielded is held in memory. A record or member that cannot
+    be read is yielded with its error; an archive that cannot be read
+    further is yielded as one error under its own path.
+    """
+    if os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for file_name in sorted(files):
+                for name, data in iter_sources(os.path.join(root, file_name)):
+                    # Name loose files relative to the directory walked
+                    if name == data:
+                        name = os.path.relpath(name, path)
+                    yield name, data
+        return
+
+    try:
+        reader = _source_reader(path)
+    except Exception as e:  # is_tarfile reads, and can fail on, the first member
+        yield path, e
+        return
+    if reader is None:
+        if _supported(path):
+            yield path, path
+        return
+    try:
+        yield from reader(path)
+    except Exception as e:
+        yield path, e
+
+
+def count_sources(path: str) -> int:
+    """Number of documents iter_sources will yield, without reading them"""
+    if os.path.isdir(path):
+        return sum(
+            count_sources(os.path.join(root, name))
+            for root, _, files in os.walk(path)
+            for name in files
+        )
+    try:
+        if path.lower().endswith(NDJSON_EXTENSIONS):
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                return sum(1 for line in f if line.strip())
+        if zipfile.is_zipfile(path):
+            with zipfile.ZipFile(path) as archive:
+                return sum(
+                    1
+                    for m in archive.infolist()
+                    if not m.is_dir() and _supported(m.filename)
+                )
+        if tarfile.is_tarfile(path):
+            with tarfile.open(path) as archive:
+                return sum(1 for m in archive if m.isfile() and _supported(m.name))
+    except Exception:
+        return 1  # iter_sources reports the unreadable file as one failure
+    return 1 if _supported(path) else 0
+
+
+def iter_text(name: str, data: Union[str, bytes]) -> Iterator[str]:
+    """Stream the text of a PDF or text document, given a path or bytes, one
+    page or block at a time"""
+    if name.lower().endswith(".pdf"):
+        yield from iter_pdf_pages(data if isinstance(data, str) else io.BytesIO(data))
+    elif isinstance(data, str):
+        yield from iter_text_blocks(data, errors="replace")
+    else:
+        yield data.decode("utf-8", errors="replace")
+
+
+def _prepare(name: str, data: Union[str, bytes], org_id: Union[str, int]):
+    """Parse, chunk and embed one document inside a worker process, hashing
+    its text as content_hash would as the pages stream past"""
+    digest = hashlib.sha256()
+
+    def pages() -> Iterator[str]:
+        separator = b""
+        for page in iter_text(name, data):
+            normalized = normalize_text(page)
+            if normalized:
+                digest.update(separator + normalized.encode("utf-8"))
+                separator = b" "
+            yield page
+
+    chunks, embeddings = chunk_and_embed(pages(), org_id)
+    return digest.hexdigest(), chunks, embeddings
+
+
+class BulkIngest:
+    """Index many documents of one org with the same sensitivity and ACL"""
+
+    def __init__(
+        self,
+        org_id: Union[str, int],
+        user_id,
+        sensitivity: int = 5,
+        acl_roles: Optional[List[str]] = None,
+    ):
+        self.org_id = org_id
+        self.user_id = user_id
+        self.sensitivity = sensitivity
+        self.acl_roles = acl_roles or ["employee"]
+        self.files: List[Dict] = []  # Per-file status, once indexed or failed
+        self.processed = 0  # Files parsed and embedded so far
+        self.chunks_created = 0
+        self._batch: List[Tuple[Dict, str, List[str], np.ndarray]] = []
+        self._batch_chunks = 0
+
+    def run(
+        self,
+        sources: Iterator[Source],
+        pool: ProcessPoolExecutor,
+        workers: int = settings.INGEST_WORKERS,
+        on_progress: Optional[Callable[["BulkIngest"], None]] = None,
+    ) -> Dict:
+        """Ingest every source with the pool's workers and return the report"""
+        start = time.perf_counter()
+        in_flight = deque()
+        max_in_flight = READ_AHEAD_PER_WORKER * workers
+
+        def collect(future, name):
+            self.processed += 1
+            try:
+                digest, chunks, embeddings = future.result()
+            except Exception as e:
+                self.files.append({"file": name, "status": "failed", "error": str(e)})
+                return
+            status = {"file": name, "status": "indexed", "chunks": len(chunks)}
+            self._batch.append((status, digest, chunks, embeddings))
+            self._batch_chunks += len(chunks)
+            if self._batch_chunks >= settings.BULK_BATCH_CHUNKS:
+                self.flush()
+
+        for name, data in sources:
+            if isinstance(data, Exception):
+                self.processed += 1
+                self.files.append(
+                    {"file": name, "status": "failed", "error": str(data)}
+                )
+                continue
+            in_flight.append((pool.submit(_prepare, name, data, self.org_id), name))
+            # Bounded read-ahead keeps memory flat however many files there are
+            while len(in_flight) >= max_in_flight:
+                collect(*in_flight.popleft())
+                if on_progress:
+                    on_progress(self)
+        while in_flight:
+            collect(*in_flight.popleft())
+        self.flush()
+        if on_progress:
+            on_progress(self)
+        return self.report(time.perf_counter() - start)
+
+    def flush(self):
+        """Record and index the batched documents in one transaction each"""
+        batch, self._batch, self._batch_chunks = self._batch, [], 0
+        if not batch:
+            return
+
+        for status, *_ in batch:
+            status["doc_id"] = str(uuid.uuid4())
+        claimed = claim_documents(
+            [
+                (
+                    status["doc_id"],
+                    self.org_id,
+                    self.user_id,
+                    os.path.basename(status["file"]),
+                    self.sensitivity,
+                    self.acl_roles,
+                    digest,
+                )
+                for status, digest, _, _ in batch
+            ]
+        )
+        existing = {
+            status["doc_id"]: other for (status, *_), other in zip(batch, claimed)
+        }
+        new_ids = {doc_id for doc_id, other in existing.items() if other is None}
+
+        docs, embeddings = [], []
+        for status, _, chunks, chunk_embeddings in batch:
+            if status["doc_id"] not in new_ids:
+                status.update(
+                    status="duplicate", chunks=0, doc_id=existing[status["doc_id"]]
+                )
+                continue
+            docs.extend(
+                {
+                    "chunk_id": str(uuid.uuid4()),
+                    "doc_id": status["doc_id"],
+                    "org_id": self.org_id,
+                    "text": text,
+                    "sensitivity": self.sensitivity,
+                    "acl_roles": self.acl_roles,
+                }
+                for text in chunks
+            )
+            embeddings.append(chunk_embeddings)
+
+        try:
+            if docs:
+                SafeFAISS.add(
+                    docs, self.user_id, self.org_id, embeddings=np.vstack(embeddings)
+                )
+            mark_documents_indexed(new_ids)
+        except Exception as e:
+            forget_documents(new_ids)
+            for status, *_ in batch:
+                if status["doc_id"] in new_ids:
+                    status.update(status="failed", chunks=0, error=str(e))
+        else:
+            self.chunks_created += len(docs)
+        self.files.extend(status for status, *_ in batch)
+
+    def report(self, elapsed: float) -> Dict:
+        """Per-file status and throughput"""
+        counts = {"indexed": 0, "duplicate": 0, "failed": 0}
+        for status in self.files:
+            counts[status["status"]] += 1
+        return {
+            "files": self.files,
+            **counts,
+            "chunks_created": self.chunks_created,
+            "elapsed_s": elapsed,
+            "files_per_s": len(self.files) / elapsed if elapsed else 0.0,
+            "chunks_per_s": self.chunks_created / elapsed if elapsed else 0.0,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", help="Directory, .zip/.tar(.gz) archive or NDJSON")
+    parser.add_argument("--org-id", required=True)
+    parser.add_argument("--user-id", default="101")
+    parser.add_argument("--sensitivity", type=int, default=5)
+    parser.add_argument("--acl-roles", default="employee")
+    parser.add_argument("--workers", type=int, default=settings.INGEST_WORKERS)
+    args = parser.parse_args()
+
+    try:
+        SafeFAISS.lock_writer()
+    except RuntimeError as e:
+        sys.exit(f"[!] {e}")
+    init_db()
+    total = count_sources(args.path)
+    print(f"Ingesting {total} documents from {args.path}...")
+
+    def on_progress(bulk: BulkIngest):
+        print(f"\r{bulk.processed}/{total} files", end="", flush=True)
+
+    bulk = BulkIngest(
+        args.org_id, args.user_id, args.sensitivity, args.acl_roles.split(",")
+    )
+    with ProcessPoolExecutor(
+        max_workers=args.workers, mp_context=multiprocessing.get_context("spawn")
+    ) as pool:
+        report = bulk.run(iter_sources(args.path), pool, args.workers, on_progress)
+    SafeFAISS.save_all()
+    print()
+
+    for status in report["files"]:
+        if status["status"] == "failed":
+            print(f"[!] {status['file']}: {status['error']}")
+    print(
+        f"{report['indexed']} indexed, {report['duplicate']} duplicate, "
+        f"{report['failed']} failed; {report['chunks_created']} chunks in "
+        f"{report['elapsed_s']:.1f}s ({report['files_per_s']:.1f} files/s, "
+        f"{report['chunks_per_s']:.1f} chunks/s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -9,17 +9,69 @@ class Settings(BaseSettings):
     JWT_SECRET: str = "your-secret-key"
     JWT_ALGORITHM: str = "HS256"
     JWT_EXPIRATION: int = 3600  # 1 hour
+    USER_CACHE_SIZE: int = 10000
+    USER_CACHE_TTL: int = 300  # Seconds; entries also expire with their token
 
     # Database Settings
     USER_DATABASE_URL: str = "user_sentry.db"
     DOC_DATABASE_URL: str = "doc_sentry.db"
+    DB_MMAP_SIZE: int = 256 * 1024 * 1024
+    DB_STATEMENT_CACHE_SIZE: int = 256
+    DB_BUSY_TIMEOUT_MS: int = 5000
 
     # Embedding Model
     EMBEDDING_MODEL: str = "all-MiniLM-L6-v2"
+    EMBEDDING_DIM: int = 384
+    EMBEDDING_BATCH_SIZE: int = 64
+    EMBEDDING_BACKEND: str = "torch"  # torch, onnx or onnx_int8 (CPU inference)
+    EMBEDDING_QUANTIZATION: str = "avx512_vnni"  # onnx_int8: arm64, avx2, avx512(_vnni)
+    EMBEDDING_MODEL_DIR: str = "models"  # Where ONNX exports are written
+    EMBEDDING_CACHE_ENABLED: bool = True  # Reuse vectors of unchanged chunks
+    EMBEDDING_STORE_DTYPE: str = "float32"  # float32, float16 or int8 on disk
+    QUERY_EMBEDDING_CACHE_SIZE: int = 10000
+    QUERY_RESULT_CACHE_SIZE: int = 10000
+    CHUNK_MAX_TOKENS: int = 256  # Including special tokens; capped by the model
+    CHUNK_OVERLAP_TOKENS: int = 32
+
+    # Vector Index Settings
+    INDEX_DIR: str = "indexes"
+    INDEX_CACHE_MAX_TENANTS: int = 64
+    INDEX_CACHE_MAX_MB: int = 1024
+    INDEX_TYPE: str = "hnsw"  # flat, ivf_flat, ivf_pq or hnsw
+    INDEX_ANN_THRESHOLD: int = 50000  # Promote a tenant from flat past this size
+    INDEX_IVF_NLIST: int = 1024
+    INDEX_IVF_NPROBE: int = 16
+    INDEX_PQ_M: int = 48
+    INDEX_HNSW_M: int = 32
+    INDEX_HNSW_EF_CONSTRUCTION: int = 200
+    INDEX_HNSW_EF_SEARCH: int = 64
+    INDEX_SAVE_INTERVAL: int = 10000  # Vectors added between index snapshots
+
+    # Ingest Job Settings
+    INGEST_WORKERS: int = 2
+    INGEST_JOB_HISTORY: int = 1000
+    INGEST_BATCH_DOCS: int = 16  # Queued documents embedded in one model call
+    BULK_BATCH_CHUNKS: int = 5000  # Chunks indexed per transaction in bulk ingest
+
+    # Embedding Scrambling
+    SCRAMBLE_ENABLED: bool = False
+    SCRAMBLE_SECRET: str = "your-scramble-secret"
+
+    # Audit Log Settings
+    AUDIT_BATCH_SIZE: int = 100
+    AUDIT_FLUSH_INTERVAL_MS: int = 200
+    AUDIT_BUFFER_SIZE: int = 10000  # Records awaiting write
+    AUDIT_ENQUEUE_TIMEOUT: float = 5.0  # Seconds to wait for room, then 503
 
     # Security Settings
     SIMILARITY_THRESHOLD: float = 0.3
     MAX_CHUNKS_PER_QUERY: int = 5
+    MAX_QUERIES_PER_BATCH: int = 1000
+
+    # Prompt Injection Guard
+    INJECTION_RULES_PATH: str = ""  # Empty uses the bundled rules file
+    INJECTION_RULES_RELOAD_INTERVAL: float = 5.0  # Seconds between mtime checks
+    INJECTION_MAX_QUERY_LENGTH: int = 4096
 
     # PII Detection
     PII_DETECTION_ENABLED: bool = True
@@ -1,28 +1,217 @@
+import json
+import os
 import sqlite3
+import threading
+from typing import Iterable, List, Optional, Tuple
+from urllib.parse import unquote
 
+from app.config import settings
+from app.services.vector_store import VectorFile
+from app.utils.cache import LRUCache
 
-def get_db_connection():
-    """Get database connection"""
-    return sqlite3.connect("docs.db")
+DB_PATH = "docs.db"
+
+_local = threading.local()
+_connections = []
+_connections_lock = threading.Lock()
+_generation = 0  # Bumped on shutdown so threads drop their closed connections
+
+# Resolved user records for get_current_user, keyed by user_id
+user_cache = LRUCache(maxsize=settings.USER_CACHE_SIZE, ttl=settings.USER_CACHE_TTL)
+
+
+def invalidate_user_cache():
+    """Drop cached user records; call after any write to users or organizations"""
+    user_cache.clear()
+
+
+# SQLite caps bound parameters per statement; batch IN (...) lookups to stay
+# well under the limit
+LOOKUP_BATCH = 500
+
+
+def get_db_connection() -> sqlite3.Connection:
+    """Get this thread's pooled database connection.
+
+    Connections are reused across requests, so callers must not close them;
+    use `with conn:` to commit (or roll back) a transaction.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.generation != _generation:
+        conn = sqlite3.connect(
+            DB_PATH,
+            check_same_thread=False,  # Only so shutdown can close it
+            cached_statements=settings.DB_STATEMENT_CACHE_SIZE,
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA mmap_size={int(settings.DB_MMAP_SIZE)}")
+        conn.execute(f"PRAGMA busy_timeout={int(settings.DB_BUSY_TIMEOUT_MS)}")
+        _local.conn = conn
+        _local.generation = _generation
+        with _connections_lock:
+            _connections.append(conn)
+    return conn
+
+
+def close_db_connections():
+    """Close every pooled connection; called on application shutdown"""
+    global _generation
+    with _connections_lock:
+        _generation += 1
+        for conn in _connections:
+            try:
+                # Refresh planner statistics for the queries this connection ran
+                conn.execute("PRAGMA optimize")
+            except sqlite3.Error as e:
+                print(f"[!] PRAGMA optimize failed: {e}")
+            conn.close()
+        _connections.clear()
+
+
+def claim_documents(documents: List[Tuple]) -> List[Optional[str]]:
+    """Record (doc_id, org_id, owner_id, title, sensitivity, acl_roles,
+    content_hash) documents in one transaction, as still indexing. Each maps
+    to None if it was new, or to the id of the identical document recorded
+    before it.
+
+    Documents are identical when the org, content hash, sensitivity and ACL
+    all match; the unique index makes concurrent uploads race safely.
+    """
+    conn = get_db_connection()
+    existing = []
+    with conn:
+        for (
+            doc_id,
+            org_id,
+            owner_id,
+            title,
+            sensitivity,
+            acl_roles,
+            digest,
+        ) in documents:
+            key = (str(org_id), digest, str(sensitivity), json.dumps(sorted(acl_roles)))
+            cursor = conn.execute(
+                """
+                INSERT OR IGNORE INTO documents (
+                    doc_id, org_id, owner_id, title, sensitivity, acl_roles,
+                    content_hash, status
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, 'indexing')
+            """,
+                (doc_id, key[0], str(owner_id), title, key[2], key[3], digest),
+            )
+            if cursor.rowcount:
+                existing.append(None)
+                continue
+            (other,) = conn.execute(
+                """
+                SELECT doc_id FROM documents
+                WHERE org_id = ? AND content_hash = ? AND sensitivity = ? AND acl_roles = ?
+            """,
+                key,
+            ).fetchone()
+            existing.append(other)
+    return existing
+
+
+def forget_documents(doc_ids: Iterable[str]):
+    """Remove documents whose ingest failed, and their chunks, so they can
+    be uploaded again"""
+    rows = [(doc_id,) for doc_id in doc_ids]
+    conn = get_db_connection()
+    with conn:
+        conn.executemany("DELETE FROM chunks WHERE doc_id = ?", rows)
+        conn.executemany("DELETE FROM documents WHERE doc_id = ?", rows)
+
+
+def mark_documents_indexed(doc_ids: Iterable[str]):
+    """Record that documents' chunks are in their org's index"""
+    conn = get_db_connection()
+    with conn:
+        conn.executemany(
+            "UPDATE documents SET status = 'indexed' WHERE doc_id = ?",
+            [(doc_id,) for doc_id in doc_ids],
+        )
+
+
+def forget_interrupted_documents():
+    """Forget documents whose ingest was cut short by the process dying, so
+    a later upload indexes them rather than calling them duplicates. Only
+    the process holding the INDEX_DIR writer lock ingests, so at startup
+    none is still running."""
+    conn = get_db_connection()
+    doc_ids = [
+        row[0]
+        for row in conn.execute(
+            "SELECT doc_id FROM documents WHERE status = 'indexing'"
+        ).fetchall()
+    ]
+    if doc_ids:
+        print(f"[!] Forgetting {len(doc_ids)} documents left mid-ingest")
+        forget_documents(doc_ids)
 
 
 def init_db():
-    """Initialize database tables and demo data"""
+    """Migrate the schema to the latest version, clean up interrupted
+    ingests and create demo data"""
     conn = get_db_connection()
-    cursor = conn.cursor()
+    migrate(conn)
+    forget_interrupted_documents()
+    with conn:
+        cursor = conn.cursor()
+
+        # Create demo data
+        _create_demo_data(cursor)
+    invalidate_user_cache()
 
-    # Create tables
-    _create_tables(cursor)
 
-    # Create demo data
-    _create_demo_data(cursor)
+def migrate(conn: sqlite3.Connection):
+    """Apply pending migrations, each in its own transaction.
 
-    conn.commit()
-    conn.close()
+    The schema version is kept in PRAGMA user_version; migration i (1-based)
+    is MIGRATIONS[i - 1]. Never edit a released migration, append a new one.
+    """
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version >= len(MIGRATIONS):
+        return
+    for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        print(f"Migrating database to version {number}: {migration.__doc__}")
+        conn.execute("BEGIN")
+        try:
+            migration(conn.cursor())
+            conn.execute(f"PRAGMA user_version = {number}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    # New indexes only help once the planner has statistics for them
+    conn.execute("ANALYZE")
+
+
+def move_loader_documents(cursor):
+    """Rename a documents (id, name, content) table left by the docs_db
+    loader, from before it used raw_documents, out of the app's way"""
+    columns = {row[1] for row in cursor.execute("PRAGMA table_info(documents)")}
+    if "name" not in columns or "doc_id" in columns:
+        return
+    cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'raw_documents'"
+    )
+    if cursor.fetchone() is None:
+        cursor.execute("ALTER TABLE documents RENAME TO raw_documents")
+        return
+    moved = "name, page, content" if "page" in columns else "name, content"
+    cursor.execute(
+        f"INSERT INTO raw_documents ({moved}) SELECT {moved} FROM documents ORDER BY id"
+    )
+    cursor.execute("DROP TABLE documents")
 
 
 def _create_tables(cursor):
-    """Create all database tables"""
+    """Create all database tables (the initial schema)"""
+    # The loader shares docs.db (it also loads users_login_data)
+    move_loader_documents(cursor)
+
     cursor.execute(
         """
         CREATE TABLE IF NOT EXISTS organizations (
@@ -63,6 +252,14 @@ def _create_tables(cursor):
     """
     )
 
+    # One row per distinct document and access policy in an org
+    cursor.execute(
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_documents_content
+        ON documents (org_id, content_hash, sensitivity, acl_roles)
+    """
+    )
+
     cursor.execute(
         """
         CREATE TABLE IF NOT EXISTS chunks (
@@ -77,6 +274,17 @@ def _create_tables(cursor):
     """
     )
 
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS embedding_cache (
+            model TEXT NOT NULL,
+            chunk_hash TEXT NOT NULL,
+            embedding BLOB NOT NULL,
+            PRIMARY KEY (model, chunk_hash)
+        ) WITHOUT ROWID
+    """
+    )
+
     cursor.execute(
         """
         CREATE TABLE IF NOT EXISTS audit_logs (
@@ -94,6 +302,198 @@ def _create_tables(cursor):
     )
 
 
+def _add_lookup_indexes(cursor):
+    """Index the audit, per-document and login lookup paths"""
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_chunks_doc_id ON chunks (doc_id)")
+    cursor.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_documents_org_created
+        ON documents (org_id, created_at)
+    """
+    )
+    cursor.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_audit_logs_org_created
+        ON audit_logs (org_id, created_at)
+    """
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_audit_logs_query_id ON audit_logs (query_id)"
+    )
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_org_id ON users (org_id)")
+    # users_login_data is created by the docs_db loader, so it may not exist yet
+    cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'users_login_data'"
+    )
+    if cursor.fetchone():
+        cursor.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_users_login_data_credentials
+            ON users_login_data (user_id, org_id, password)
+        """
+        )
+
+
+def _integer_primary_keys(cursor):
+    """Key documents and chunks by INTEGER rowid; chunks also by FAISS id"""
+    cursor.execute(
+        """
+        CREATE TABLE documents_new (
+            id INTEGER PRIMARY KEY,
+            doc_id TEXT NOT NULL UNIQUE,
+            org_id TEXT NOT NULL,
+            owner_id TEXT NOT NULL,
+            title TEXT NOT NULL,
+            sensitivity TEXT NOT NULL,
+            acl_roles TEXT NOT NULL,
+            content_hash TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (org_id) REFERENCES organizations (org_id)
+        )
+    """
+    )
+    cursor.execute(
+        """
+        INSERT INTO documents_new (
+            doc_id, org_id, owner_id, title, sensitivity, acl_roles, content_hash, created_at
+        )
+        SELECT doc_id, org_id, owner_id, title, sensitivity, acl_roles, content_hash, created_at
+        FROM documents ORDER BY rowid
+    """
+    )
+    cursor.execute("DROP TABLE documents")
+    cursor.execute("ALTER TABLE documents_new RENAME TO documents")
+    cursor.execute(
+        """
+        CREATE UNIQUE INDEX idx_documents_content
+        ON documents (org_id, content_hash, sensitivity, acl_roles)
+    """
+    )
+    cursor.execute(
+        "CREATE INDEX idx_documents_org_created ON documents (org_id, created_at)"
+    )
+
+    # (org_id, faiss_id) is the chunk's position in its org's FAISS index
+    cursor.execute(
+        """
+        CREATE TABLE chunks_new (
+            id INTEGER PRIMARY KEY,
+            chunk_id TEXT NOT NULL UNIQUE,
+            doc_id TEXT NOT NULL,
+            org_id TEXT,
+            faiss_id INTEGER,
+            text TEXT NOT NULL,
+            embedding BLOB NOT NULL,
+            sensitivity TEXT NOT NULL,
+            pii_tags TEXT NOT NULL,
+            FOREIGN KEY (doc_id) REFERENCES documents (doc_id)
+        )
+    """
+    )
+    cursor.execute(
+        """
+        INSERT INTO chunks_new (chunk_id, doc_id, text, embedding, sensitivity, pii_tags)
+        SELECT chunk_id, doc_id, text, embedding, sensitivity, pii_tags
+        FROM chunks ORDER BY rowid
+    """
+    )
+    cursor.execute("DROP TABLE chunks")
+    cursor.execute("ALTER TABLE chunks_new RENAME TO chunks")
+    cursor.execute("CREATE INDEX idx_chunks_doc_id ON chunks (doc_id)")
+
+    # Backfill FAISS ids from the index sidecars written so far
+    if os.path.isdir(settings.INDEX_DIR):
+        for entry in os.scandir(settings.INDEX_DIR):
+            meta_path = os.path.join(entry.path, "index.meta.json")
+            if not os.path.exists(meta_path):
+                continue
+            with open(meta_path, "r", encoding="utf-8") as f:
+                # Sidecars written since chunks carry their faiss id have none
+                meta = json.load(f).get("meta", {})
+            cursor.executemany(
+                "UPDATE chunks SET org_id = ?, faiss_id = ? WHERE chunk_id = ?",
+                [
+                    (unquote(entry.name), int(faiss_id), chunk[2])
+                    for faiss_id, chunk in meta.items()
+                ],
+            )
+    cursor.execute("CREATE UNIQUE INDEX idx_chunks_faiss ON chunks (org_id, faiss_id)")
+
+
+def _document_status(cursor):
+    """Track whether each document's ingest finished"""
+    # Documents recorded so far were only ever kept once indexed
+    cursor.execute(
+        "ALTER TABLE documents ADD COLUMN status TEXT NOT NULL DEFAULT 'indexed'"
+    )
+
+
+def _acl_roles(cursor):
+    """Give every ACL role its own bit in chunk policy codes"""
+    cursor.execute(
+        """
+        CREATE TABLE acl_roles (
+            role TEXT PRIMARY KEY,
+            bit INTEGER NOT NULL UNIQUE
+        )
+    """
+    )
+    # The roles policy codes were built with so far, at the bits they had
+    cursor.executemany(
+        "INSERT INTO acl_roles (role, bit) VALUES (?, ?)",
+        [("employee", 0), ("manager", 1), ("hr", 2), ("admin", 3)],
+    )
+
+
+def _vector_file_embeddings(cursor):
+    """Keep each embedding only in its org's vector file"""
+    # SQLite cannot drop NOT NULL in place, so rebuild chunks
+    cursor.execute(
+        """
+        CREATE TABLE chunks_new (
+            id INTEGER PRIMARY KEY,
+            chunk_id TEXT NOT NULL UNIQUE,
+            doc_id TEXT NOT NULL,
+            org_id TEXT,
+            faiss_id INTEGER,
+            text TEXT NOT NULL,
+            embedding BLOB,  -- Only for orgs indexed before vector files
+            sensitivity TEXT NOT NULL,
+            pii_tags TEXT NOT NULL,
+            FOREIGN KEY (doc_id) REFERENCES documents (doc_id)
+        )
+    """
+    )
+    cursor.execute("INSERT INTO chunks_new SELECT * FROM chunks ORDER BY id")
+    cursor.execute("DROP TABLE chunks")
+    cursor.execute("ALTER TABLE chunks_new RENAME TO chunks")
+    cursor.execute("CREATE INDEX idx_chunks_doc_id ON chunks (doc_id)")
+    cursor.execute("CREATE UNIQUE INDEX idx_chunks_faiss ON chunks (org_id, faiss_id)")
+
+    # Drop the copies of vectors the vector files already hold
+    if os.path.isdir(settings.INDEX_DIR):
+        for entry in os.scandir(settings.INDEX_DIR):
+            count = len(VectorFile(os.path.join(entry.path, "index.vectors")))
+            cursor.execute(
+                """
+                UPDATE chunks SET embedding = NULL
+                WHERE org_id = ? AND faiss_id < ?
+            """,
+                (unquote(entry.name), count),
+            )
+
+
+# Schema versions, oldest first
+MIGRATIONS = [
+    _create_tables,
+    _add_lookup_indexes,
+    _integer_primary_keys,
+    _document_status,
+    _acl_roles,
+    _vector_file_embeddings,
+]
+
+
 def _create_demo_data(cursor):
     """Create demo organizations and users"""
     # Demo organizations
@@ -1,9 +1,17 @@
 import os
 import sqlite3
+from typing import Iterator, Tuple
 
 import pandas as pd
 from pypdf import PdfReader
 
+from app.db import move_loader_documents
+
+# Rows per CSV read/insert batch, and characters per stored text block, so
+# memory stays bounded however large the file is
+CSV_CHUNK_ROWS = 10000
+TEXT_BLOCK_CHARS = 1 << 20
+
 
 def init_db(db_path="docs.db"):
     conn = sqlite3.connect(db_path)
@@ -35,21 +43,79 @@ def init_db(db_path="docs.db"):
     """
     )
 
-    # One table for unstructured docs (txt, pdf, md, etc.)
+    # Covers the login lookup, so it never touches the table itself
     cursor.execute(
         """
-    CREATE TABLE IF NOT EXISTS documents (
+    CREATE INDEX IF NOT EXISTS idx_users_login_data_credentials
+    ON users_login_data (user_id, org_id, password)
+    """
+    )
+
+    # One table for unstructured docs (txt, pdf, md, etc.); documents is
+    # the app's table of ingested documents
+    move_loader_documents(cursor)
+    cursor.execute(
+        """
+    CREATE TABLE IF NOT EXISTS raw_documents (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         name TEXT,
+        page INTEGER,
         content TEXT
     )
     """
     )
+    # Tables created before pages were stored lack the page column
+    columns = {row[1] for row in cursor.execute("PRAGMA table_info(raw_documents)")}
+    if "page" not in columns:
+        cursor.execute("ALTER TABLE raw_documents ADD COLUMN page INTEGER")
 
     conn.commit()
     conn.close()
 
 
+def iter_pdf_pages(file_path) -> Iterator[str]:
+    """Yield the text of each non-empty PDF page, extracting every page once"""
+    reader = PdfReader(file_path)
+    for page in reader.pages:
+        text = page.extract_text()
+        if text:
+            yield text
+
+
+def iter_text_blocks(
+    file_path, block_chars=TEXT_BLOCK_CHARS, errors="strict"
+) -> Iterator[str]:
+    """Yield a text file in blocks of whole lines of about block_chars"""
+    block, size = [], 0
+    with open(file_path, "r", encoding="utf-8", errors=errors) as f:
+        for line in f:
+            block.append(line)
+            size += len(line)
+            if size >= block_chars:
+                yield "".join(block)
+                block, size = [], 0
+    if block:
+        yield "".join(block)
+
+
+def iter_pages(file_path) -> Iterator[Tuple[int, str]]:
+    """Stream a PDF or text file as (page number, text), one page at a time"""
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext == ".pdf":
+        pages = iter_pdf_pages(file_path)
+    elif ext == ".txt":
+        pages = iter_text_blocks(file_path)
+    else:
+        raise ValueError(f"Unsupported file type: {ext}")
+    return enumerate(pages, start=1)
+
+
+def iter_csv_chunks(file_path, chunk_rows=CSV_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """Stream a CSV as DataFrames of at most chunk_rows rows"""
+    with pd.read_csv(file_path, chunksize=chunk_rows) as reader:
+        yield from reader
+
+
 def insert_file(file_path, db_path="docs.db"):
     ext = os.path.splitext(file_path)[1].lower()
 
@@ -57,29 +123,23 @@ def insert_file(file_path, db_path="docs.db"):
     cursor = conn.cursor()
 
     if ext == ".csv":
-        df = pd.read_csv(file_path)
-        df.to_sql("users_login_data", conn, if_exists="append", index=False)
-        print(f"[+] Inserted CSV rows from {file_path} into users login table")
-
-    elif ext == ".pdf":
-        reader = PdfReader(file_path)
-        pdf_text = "\n".join(
-            [page.extract_text() for page in reader.pages if page.extract_text()]
-        )
-        cursor.execute(
-            "INSERT INTO documents (name, content) VALUES (?, ?)",
-            (os.path.basename(file_path), pdf_text),
+        rows = 0
+        for chunk in iter_csv_chunks(file_path):
+            chunk.to_sql("users_login_data", conn, if_exists="append", index=False)
+            conn.commit()
+            rows += len(chunk)
+        print(f"[+] Inserted {rows} CSV rows from {file_path} into users login table")
+
+    elif ext in (".pdf", ".txt"):
+        # One row per page (or text block), inserted as the file is read
+        name = os.path.basename(file_path)
+        cursor.executemany(
+            "INSERT INTO raw_documents (name, page, content) VALUES (?, ?, ?)",
+            ((name, page, text) for page, text in iter_pages(file_path)),
         )
-        print(f"[+] Inserted PDF text from {file_path} into documents")
-
-    elif ext == ".txt":
-        with open(file_path, "r", encoding="utf-8") as f:
-            text = f.read()
-        cursor.execute(
-            "INSERT INTO documents (name, content) VALUES (?, ?)",
-            (os.path.basename(file_path), text),
+        print(
+            f"[+] Inserted {ext[1:].upper()} text from {file_path} into raw_documents"
         )
-        print(f"[+] Inserted TXT text from {file_path} into documents")
 
     else:
         print(f"[!] Skipping unsupported file type: {ext}")
@@ -88,9 +148,10 @@ def insert_file(file_path, db_path="docs.db"):
     conn.close()
 
 
-# ---- Usage ----
-init_db("docs.db")
+# ---- Usage: python -m app.docs_db <file> [<file> ...] ----
+if __name__ == "__main__":
+    import sys
 
-insert_file("D:\\Competitions\\SENTRY\\backend\\users_login_data.csv", "docs.db")
-# insert_file("internal_policies.pdf", "docs.db")
-# insert_file("salary_data.csv", "docs.db")
+    init_db("docs.db")
+    for file_path in sys.argv[1:]:
+        insert_file(file_path, "docs.db")
@@ -0,0 +1,94 @@
+"""Cosine drift and speed of an embedding backend against the reference model.
+
+Usage: python -m app.embedding_parity [--backend onnx_int8] [--texts 500]
+       [--min-cosine 0.99]
+
+Chunk texts are sampled from the database. Exits non-zero when any text's
+cosine similarity to the reference embedding falls below --min-cosine.
+"""
+
+import argparse
+import sys
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from app.config import settings
+from app.db import get_db_connection
+from app.services.embedding import (
+    EMBEDDING_BACKENDS,
+    encode_texts,
+    load_embedding_model,
+)
+
+REFERENCE_BACKEND = "torch"
+
+
+def _sample_texts(n: int) -> List[str]:
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT text FROM chunks ORDER BY RANDOM() LIMIT ?", (n,))
+    texts = [row[0] for row in cursor.fetchall()]
+    cursor.close()
+    return texts
+
+
+def _timed_encode(model, texts: List[str]):
+    """Encode once to warm up, then time a second pass; returns (vectors, texts/s)"""
+    encode_texts(texts[: settings.EMBEDDING_BATCH_SIZE], model=model)
+    start = time.perf_counter()
+    embeddings = encode_texts(texts, model=model)
+    return embeddings, len(texts) / (time.perf_counter() - start)
+
+
+def parity_report(backend: str, texts: List[str]) -> Dict:
+    """Compare a backend's embeddings of texts with the reference model's"""
+    reference, reference_rate = _timed_encode(
+        load_embedding_model(REFERENCE_BACKEND), texts
+    )
+    candidate, candidate_rate = _timed_encode(load_embedding_model(backend), texts)
+
+    # Both are L2-normalized, so the row-wise dot product is the cosine
+    cosines = np.einsum("ij,ij->i", reference, candidate)
+    return {
+        "backend": backend,
+        "texts": len(texts),
+        "mean_cosine": float(cosines.mean()),
+        "p1_cosine": float(np.percentile(cosines, 1)),
+        "min_cosine": float(cosines.min()),
+        "reference_texts_per_s": reference_rate,
+        "texts_per_s": candidate_rate,
+        "speedup": candidate_rate / reference_rate,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--backend", choices=EMBEDDING_BACKENDS, default=settings.EMBEDDING_BACKEND
+    )
+    parser.add_argument("--texts", type=int, default=500)
+    parser.add_argument("--min-cosine", type=float, default=0.99)
+    args = parser.parse_args()
+
+    texts = _sample_texts(args.texts)
+    if not texts:
+        sys.exit("No chunks to compare; ingest some documents first")
+
+    report = parity_report(args.backend, texts)
+    print(f"{report['backend']} vs {REFERENCE_BACKEND} on {report['texts']} chunks")
+    print(
+        f"cosine: mean {report['mean_cosine']:.5f}, p1 {report['p1_cosine']:.5f}, "
+        f"min {report['min_cosine']:.5f}"
+    )
+    print(
+        f"speed: {report['texts_per_s']:.1f} texts/s vs "
+        f"{report['reference_texts_per_s']:.1f} ({report['speedup']:.2f}x)"
+    )
+    if report["min_cosine"] < args.min_cosine:
+        sys.exit(f"[!] Cosine drift exceeds the {args.min_cosine} floor")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Recall-vs-latency report for the ANN index types on one organization's vectors.
+
+Usage: python -m app.index_report <org_id> [--k 10] [--queries 200]
+"""
+
+import argparse
+import time
+from typing import Dict, List, Tuple, Union
+
+import numpy as np
+
+from app.db import get_db_connection
+from app.safe_faiss import (
+    INDEX_TYPES,
+    MIN_TRAINING_POINTS,
+    SafeFAISS,
+    make_index,
+    search_params,
+)
+from app.services.embedding import bytes_to_embedding
+
+
+def _load_vectors(org_id: Union[str, int]) -> Tuple[np.ndarray, np.ndarray]:
+    """Load an org's stored chunk embeddings as (faiss ids, float32 matrix)"""
+    tenant = SafeFAISS.get(org_id)
+    if tenant.has_vectors():
+        return np.arange(tenant.next_id), tenant.vectors.load(tenant.next_id)
+
+    # Tenants indexed before the vector file: decode the chunk rows
+    conn = get_db_connection()
+    rows = conn.execute(
+        """
+        SELECT faiss_id, embedding FROM chunks
+        WHERE org_id = ? AND embedding IS NOT NULL
+        ORDER BY faiss_id
+    """,
+        (tenant.org_key,),
+    ).fetchall()
+    ids = np.array([faiss_id for faiss_id, _ in rows], dtype=np.int64)
+    vectors = np.stack([bytes_to_embedding(emb) for _, emb in rows])
+    return ids, vectors
+
+
+def _timed_search(index, params, queries: np.ndarray, k: int):
+    """Search one query at a time; returns (ids, mean latency in ms)"""
+    results = []
+    start = time.perf_counter()
+    for query in queries:
+        _, indices = index.search(query[np.newaxis, :], k, params=params)
+        results.append(indices[0])
+    elapsed = time.perf_counter() - start
+    return np.stack(results), elapsed * 1000 / len(queries)
+
+
+def recall_report(
+    org_id: Union[str, int], k: int = 10, n_queries: int = 200, seed: int = 0
+) -> List[Dict]:
+    """Measure recall@k and per-query latency of each index type against flat"""
+    ids, vectors = _load_vectors(org_id)
+    n_queries = min(n_queries, len(vectors) // 2)
+    if n_queries == 0:
+        return []
+
+    # Held-out queries, so no query trivially finds itself
+    order = np.random.default_rng(seed).permutation(len(vectors))
+    queries = vectors[order[:n_queries]]
+    base_ids, base = ids[order[n_queries:]], vectors[order[n_queries:]]
+
+    report = []
+    truth = None
+    for index_type in INDEX_TYPES:
+        if len(base) < MIN_TRAINING_POINTS.get(index_type, 0):
+            continue
+        index = make_index(index_type, base)
+        index.add_with_ids(base, base_ids)
+        found, latency_ms = _timed_search(index, search_params(index_type), queries, k)
+        if truth is None:  # flat comes first and is exact
+            truth = found
+
+        hits = sum(
+            len(set(row[row != -1]) & set(exact[exact != -1]))
+            for row, exact in zip(found, truth)
+        )
+        report.append(
+            {
+                "index_type": index_type,
+                "recall": hits / max(1, int((truth != -1).sum())),
+                "latency_ms": latency_ms,
+            }
+        )
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("org_id")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'index':<10} {'recall@' + str(args.k):>10} {'ms/query':>10}")
+    for row in recall_report(args.org_id, args.k, args.queries):
+        print(
+            f"{row['index_type']:<10} {row['recall']:>10.3f} {row['latency_ms']:>10.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -12,7 +12,7 @@ async def login(req: LoginRequest):
     cursor = conn.cursor()
     cursor.execute(
         """
-        SELECT *
+        SELECT 1
         FROM users_login_data
         WHERE user_id = ? AND org_id = ? AND password = ?
         """,
@@ -23,8 +23,7 @@ async def login(req: LoginRequest):
         ),
     )
     user = cursor.fetchone()
-    conn.commit()
-    conn.close()
+    cursor.close()
 
     if user:
         access_token = create_access_token(req.user_id)
@@ -46,7 +45,7 @@ async def list_demo_users():
     """
     )
     users = cursor.fetchall()
-    conn.close()
+    cursor.close()
 
     user_list = [
         {
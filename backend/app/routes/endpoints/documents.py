@@ -1,24 +1,36 @@
-import hashlib
+import json
+import os
+import shutil
+import tempfile
 import uuid
+from typing import Dict, Iterator, List, Tuple
 
-from app.db import get_db_connection
-from app.safe_faiss import SafeFAISS
+from app.config import settings
 from app.schemas.base import (
+    BatchQueryResult,
+    BulkIngestJob,
     DocumentIngest,
-    DocumentResponse,
+    IngestJob,
     QueryRequest,
     QueryResponse,
 )
+from app.services.audit import audit_log
 from app.services.auth import detect_prompt_injection
-from app.services.embedding import chunk_text
-from fastapi import APIRouter, HTTPException
+from app.services.jobs import ingest_queue
+from app.services.retrieve import retrieve, retrieve_batch
+from fastapi import APIRouter, File, Form, HTTPException, Request, UploadFile
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 
 router = APIRouter()
 
+# Demo identity used until /query is wired to get_current_user
+DEMO_USER = {"user_id": 101, "org_id": 1, "role": "employee", "clearance": "manager"}
 
-@router.post("/ingest", response_model=DocumentResponse)
+
+@router.post("/ingest", response_model=IngestJob, status_code=202)
 async def ingest(doc: DocumentIngest):
-    """Ingest a document and create chunks"""
+    """Queue a document for chunking, embedding and indexing"""
     # Convert org_id to string for comparison
     # user_org_id = str(user["org_id"])
     # doc_org_id = str(doc.org_id)
@@ -28,106 +40,236 @@ async def ingest(doc: DocumentIngest):
     #         status_code=403, detail="Cannot ingest documents for other organizations"
     #     )
 
-    doc_id = str(uuid.uuid4())
-
-    # Use the actual document content, not fetched docs
-    content_hash = hashlib.sha256(doc.content.encode()).hexdigest()
-
-    # Chunk the actual document content
-    paragraphs = chunk_text(doc.content)  # Fixed: use doc.content instead of docs[0][1]
-
-    # Insert chunks
-    chunks_created = []
-    for i, paragraph in enumerate(paragraphs):
-        chunks_created.append(
-            {
-                "chunk_id": str(uuid.uuid4()),
-                "doc_id": doc_id,
-                "org_id": doc.org_id,
-                "text": paragraph,
-                "sensitivity": doc.sensitivity,
-            }
+    return ingest_queue.submit(doc)
+
+
+@router.get("/jobs/{job_id}", response_model=IngestJob)
+async def ingest_job_status(job_id: str):
+    """Report the progress of a queued ingest job"""
+    job = ingest_queue.get(job_id)
+    if job is None or job.get("kind") == "bulk":
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+def _save_uploads(files: List[UploadFile]) -> str:
+    """Copy uploaded files into a new temporary directory and return it"""
+    workdir = tempfile.mkdtemp(prefix="bulk-")
+    try:
+        for i, upload in enumerate(files):
+            # One directory per upload keeps the file name as the title
+            upload_dir = os.path.join(workdir, str(i))
+            os.mkdir(upload_dir)
+            name = os.path.basename(upload.filename or "") or "upload.txt"
+            with open(os.path.join(upload_dir, name), "wb") as f:
+                shutil.copyfileobj(upload.file, f, 1 << 20)
+    except Exception:
+        shutil.rmtree(workdir, ignore_errors=True)
+        raise
+    return workdir
+
+
+@router.post("/ingest/bulk", response_model=BulkIngestJob, status_code=202)
+async def ingest_bulk(
+    files: List[UploadFile] = File(...),
+    org_id: str = Form(...),
+    sensitivity: int = Form(5),
+    acl_roles: str = Form("employee"),
+):
+    """Queue uploaded files (text, PDF, or zip/tar archives) for bulk ingest"""
+    # Disk writes run in a thread, so large uploads never stall queries
+    workdir = await run_in_threadpool(_save_uploads, files)
+    return ingest_queue.submit_bulk(
+        workdir, org_id, sensitivity, acl_roles.split(","), workdir
+    )
+
+
+@router.post("/ingest/bulk/ndjson", response_model=BulkIngestJob, status_code=202)
+async def ingest_bulk_ndjson(
+    request: Request,
+    org_id: str,
+    sensitivity: int = 5,
+    acl_roles: str = "employee",
+):
+    """Queue an NDJSON body of {"title", "content"} lines for bulk ingest"""
+    workdir = await run_in_threadpool(tempfile.mkdtemp, prefix="bulk-")
+    path = os.path.join(workdir, "documents.ndjson")
+    f = await run_in_threadpool(open, path, "wb")
+    try:
+        async for chunk in request.stream():
+            await run_in_threadpool(f.write, chunk)
+    except Exception:
+        await run_in_threadpool(shutil.rmtree, workdir, ignore_errors=True)
+        raise
+    finally:
+        await run_in_threadpool(f.close)
+    return ingest_queue.submit_bulk(
+        path, org_id, sensitivity, acl_roles.split(","), workdir
+    )
+
+
+@router.get("/ingest/bulk/{job_id}", response_model=BulkIngestJob)
+async def bulk_ingest_job_status(job_id: str):
+    """Report the progress, and once done the per-file report, of a bulk job"""
+    job = ingest_queue.get(job_id)
+    if job is None or job.get("kind") != "bulk":
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+def _reject_injection(query_id: str, query: str):
+    """Audit and refuse a query that looks like a prompt injection"""
+    if detect_prompt_injection(query):
+        audit_log.record(
+            query_id,
+            DEMO_USER["user_id"],
+            DEMO_USER["org_id"],
+            query,
+            "disallowed",
+            1,
+            0,
         )
+        raise HTTPException(status_code=400, detail="Prompt injection detected")
 
-    # Build FAISS index
-    print("sdasd:", chunks_created)
-    SafeFAISS.build(chunks_created, user_id=101, org_id=1)
 
-    return DocumentResponse(
-        doc_id=doc_id,
-        chunks_created=len(chunks_created),
-        chunks=chunks_created,
-        pii_stats={},  # Placeholder for PII statistics
+def _citation_audit(query_id: str, query: str, citations: List[Dict]) -> Tuple:
+    """Audit record of the chunks returned for a query"""
+    # Only chunks the user may see are searched, so every hit is allowed
+    decisions = [
+        {"chunk_id": c["chunk_id"], "decision": "allow", "score": c["score"]}
+        for c in citations
+    ]
+    return (
+        query_id,
+        DEMO_USER["user_id"],
+        DEMO_USER["org_id"],
+        query,
+        json.dumps(decisions),
+        len(citations),
+        0,
     )
 
 
+def _audit_citations(query_id: str, query: str, citations: List[Dict]) -> Dict:
+    """Audit the chunks returned for a query and return the audit summary"""
+    audit_log.record(*_citation_audit(query_id, query, citations))
+    return {"allowed_chunks": len(citations), "denied_chunks": 0}
+
+
 @router.post("/query", response_model=QueryResponse)
-async def query(query: QueryRequest):
+def query(query: QueryRequest):
     """Query documents and retrieve relevant information"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    if detect_prompt_injection(query.query):
-        cursor.execute(
-            """
-            INSERT INTO audit_logs (
-                log_id, query_id, user_id, org_id, query, decisions, allowed_chunks, denied_chunks
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            (
-                str(uuid.uuid4()),
-                str(uuid.uuid4()),
-                101,
-                1,
-                query.query,
-                "disallowed",
-                1,
-                0,
-            ),
-        )
-
-        raise HTTPException(status_code=400, detail="Prompt injection detected")
+    # A plain def runs in the threadpool: retrieval and a full audit buffer
+    # block this request only, never the event loop
+    query_id = str(uuid.uuid4())
+    _reject_injection(query_id, query.query)
 
     # if not user:
     #     raise HTTPException(status_code=401, detail="Unauthorized")
 
-    results = SafeFAISS.search(query.query, k=1, user_id=1)
-    print(results[0])
+    citations = retrieve(query.query, DEMO_USER, query.purpose, query.max_chunks)
+    audit = _audit_citations(query_id, query.query, citations)
+    if not citations:
+        raise HTTPException(status_code=404, detail="No matching documents")
 
-    cursor.execute(
-        """
-        SELECT text, sensitivity, pii_tags
-        FROM chunks
-        WHERE chunk_id = ?
-    """,
-        (results[1][1][2],),
+    return QueryResponse(
+        answer="\n\n".join(c["text"] for c in citations),
+        citations=citations,
+        audit=audit,
+        query_id=query_id,
     )
-    doc_data = cursor.fetchone()
-    print("jsjda:", doc_data)
-
-    cursor.execute(
-        """
-        INSERT INTO audit_logs (
-            log_id, query_id, user_id, org_id, query, decisions, allowed_chunks, denied_chunks
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """,
-        (
-            str(uuid.uuid4()),
-            str(uuid.uuid4()),
-            results[1][0][2],
-            results[1][0][1],
-            query.query,  # query
-            "allowed",
-            1,
-            0,
-        ),
+
+
+@router.post("/query/batch", response_model=List[BatchQueryResult])
+def query_batch(queries: List[QueryRequest]):
+    """Answer many queries in one call, returning results in request order.
+
+    Queries are embedded and searched together and their audit records are
+    written in one transaction. A refused or unanswered query carries an
+    error instead of failing the batch.
+    """
+    if len(queries) > settings.MAX_QUERIES_PER_BATCH:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {settings.MAX_QUERIES_PER_BATCH} queries per batch",
+        )
+
+    query_ids = [str(uuid.uuid4()) for _ in queries]
+    refused = [detect_prompt_injection(q.query) for q in queries]
+    accepted = [i for i, flagged in enumerate(refused) if not flagged]
+    found = retrieve_batch(
+        [
+            (queries[i].query, queries[i].purpose, queries[i].max_chunks)
+            for i in accepted
+        ],
+        DEMO_USER,
     )
+    citations: List[List[Dict]] = [[] for _ in queries]
+    for i, query_citations in zip(accepted, found):
+        citations[i] = query_citations
 
-    conn.commit()
-    conn.close()
+    results, records = [], []
+    for query_id, q, flagged, cited in zip(query_ids, queries, refused, citations):
+        if flagged:
+            records.append(
+                (
+                    query_id,
+                    DEMO_USER["user_id"],
+                    DEMO_USER["org_id"],
+                    q.query,
+                    "disallowed",
+                    1,
+                    0,
+                )
+            )
+            results.append(
+                BatchQueryResult(query_id=query_id, error="Prompt injection detected")
+            )
+            continue
+        records.append(_citation_audit(query_id, q.query, cited))
+        results.append(
+            BatchQueryResult(
+                query_id=query_id,
+                answer="\n\n".join(c["text"] for c in cited) if cited else None,
+                citations=cited,
+                audit={"allowed_chunks": len(cited), "denied_chunks": 0},
+                error=None if cited else "No matching documents",
+            )
+        )
+    audit_log.record_many(records)
+    return results
 
-    return QueryResponse(
-        answer=doc_data[0],
-        citations=[{}],
-        audit={},
-        query_id=str(uuid.uuid4()),
+
+def _sse(event: str, data: Dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.post("/query/stream")
+async def query_stream(query: QueryRequest):
+    """Query documents, streaming citations as Server-Sent Events.
+
+    The search runs and its audit row is recorded before the response
+    starts, as for /query, so no chunk is ever sent unaudited. Events:
+    `start` with the query id, one `citation` per chunk, best first, then
+    `done` with the audit summary.
+    """
+    query_id = str(uuid.uuid4())
+
+    def answer() -> Tuple[List[Dict], Dict]:
+        _reject_injection(query_id, query.query)
+        citations = retrieve(query.query, DEMO_USER, query.purpose, query.max_chunks)
+        return citations, _audit_citations(query_id, query.query, citations)
+
+    citations, audit = await run_in_threadpool(answer)
+
+    def events() -> Iterator[str]:
+        yield _sse("start", {"query_id": query_id})
+        for citation in citations:
+            yield _sse("citation", citation)
+        yield _sse("done", {"query_id": query_id, "audit": audit})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
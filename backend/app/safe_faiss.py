@@ -1,64 +1,596 @@
-from typing import Dict, List, Optional
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple, Union
+from urllib.parse import quote, unquote
 
 import faiss
 import numpy as np
 
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from app.config import settings
 from app.db import get_db_connection
-from app.services.embedding import scramble_embedding
+from app.services.embedding import embed_texts, embedding_to_bytes
+from app.services.embedding_cache import content_hash, embedding_cache
+from app.services.policy import POLICY_DTYPE, policy_engine
+from app.services.vector_store import VectorFile
+from app.utils.cache import LRUCache
 
+INDEX_FILE = "index.faiss"
+META_FILE = "index.meta.json"
+POLICY_FILE = "index.policy.npy"
+VECTORS_FILE = "index.vectors"
+WRITER_LOCK_FILE = "writer.lock"
 
-# ---- Build FAISS index with user_id mapping ----
-class SafeFAISS:
-    _index: Optional[faiss.Index] = None
-    _meta: Optional[Dict] = None
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+# Fewest vectors each trained index type can learn its quantizers from
+MIN_TRAINING_POINTS = {"ivf_flat": 39, "ivf_pq": 256}
 
-    @classmethod
-    def build(cls, docs: List[str], user_id: int, org_id: int):
+
+def _write_atomic(path: str, write):
+    """Write a file via a temporary sibling and rename it into place"""
+    tmp_path = path + ".tmp"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _ivf_nlist(ntrain: int) -> int:
+    # FAISS wants at least ~39 training points per centroid
+    return max(1, min(settings.INDEX_IVF_NLIST, ntrain // 39))
+
+
+def make_index(index_type: str, train: Optional[np.ndarray] = None) -> faiss.Index:
+    """Create an id-mapped inner-product index of the given type, trained on the sample"""
+    d = settings.EMBEDDING_DIM
+    metric = faiss.METRIC_INNER_PRODUCT  # Cosine similarity on normalized vectors
+    if index_type == "flat":
+        inner = faiss.IndexFlatIP(d)
+    elif index_type == "hnsw":
+        inner = faiss.IndexHNSWFlat(d, settings.INDEX_HNSW_M, metric)
+        inner.hnsw.efConstruction = settings.INDEX_HNSW_EF_CONSTRUCTION
+    elif index_type == "ivf_flat":
+        inner = faiss.index_factory(d, f"IVF{_ivf_nlist(len(train))},Flat", metric)
+    elif index_type == "ivf_pq":
+        inner = faiss.index_factory(
+            d, f"IVF{_ivf_nlist(len(train))},PQ{settings.INDEX_PQ_M}", metric
+        )
+    else:
+        raise ValueError(f"Unknown index type: {index_type}")
+
+    if not inner.is_trained:
+        inner.train(train)
+    return faiss.IndexIDMap(inner)
+
+
+def search_params(
+    index_type: str, sel: Optional[faiss.IDSelector] = None
+) -> Optional[faiss.SearchParameters]:
+    """Query-time tuning knobs for an index type, optionally restricted to sel"""
+    if index_type == "hnsw":
+        params = faiss.SearchParametersHNSW(efSearch=settings.INDEX_HNSW_EF_SEARCH)
+    elif index_type in ("ivf_flat", "ivf_pq"):
+        params = faiss.SearchParametersIVF(nprobe=settings.INDEX_IVF_NPROBE)
+    elif sel is not None:
+        params = faiss.SearchParameters()
+    else:
+        return None
+    if sel is not None:
+        params.sel = sel
+    return params
+
+
+def _bytes_per_vector(index_type: str) -> int:
+    """Approximate resident bytes per vector, including the 8-byte id map entry"""
+    d = settings.EMBEDDING_DIM
+    if index_type == "ivf_pq":
+        return settings.INDEX_PQ_M + 16
+    if index_type == "hnsw":
+        return d * 4 + settings.INDEX_HNSW_M * 2 * 4 + 8
+    if index_type == "ivf_flat":
+        return d * 4 + 16
+    return d * 4 + 8
+
+
+class TenantIndex:
+    """One organization's FAISS index and the policy codes of its vectors.
+
+    The chunks table maps (org, faiss id) to chunks. Adds write the chunk
+    rows and the vector file at once; the index, policy codes and next id
+    are snapshotted every INDEX_SAVE_INTERVAL vectors, and load() replays
+    whatever was added after the last snapshot.
+    """
+
+    def __init__(self, org_key: str, lock: threading.Lock):
+        self.org_key = org_key
+        self.lock = lock  # Shared by every instance of this org, even evicted ones
+        self.index: Optional[faiss.Index] = None
+        self.index_type = "flat"
+        self.policy = np.zeros(0, dtype=POLICY_DTYPE)  # Sorted by id
+        self.next_id = 0
+        self.saved_id = 0  # next_id as of the last snapshot
+        # Set once dropped from the registry: a reload from disk takes over
+        # its ids, so writes must go through the registered instance
+        self.evicted = False
+        # (role, clearance, dsar) → allowed-id bitmap; rebuilt after every add
+        self._selectors: Dict[Tuple, Tuple[np.ndarray, faiss.IDSelector]] = {}
+
+    @property
+    def path(self) -> str:
+        # Escape the org id so it is always a single, safe directory name
+        return os.path.join(
+            settings.INDEX_DIR, quote(self.org_key, safe="").replace(".", "%2E")
+        )
+
+    @property
+    def vectors(self) -> VectorFile:
+        """Every vector of the tenant, row i holding faiss id i"""
+        return VectorFile(os.path.join(self.path, VECTORS_FILE))
+
+    def has_vectors(self) -> bool:
+        """Whether the vector file covers every faiss id (older tenants have none)"""
+        return len(self.vectors) >= self.next_id
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate resident size of the index"""
+        return self.index.ntotal * _bytes_per_vector(self.index_type)
+
+    def load(self):
+        """Load the last snapshot, or start an empty index, then replay the
+        vectors added since"""
+        index_path = os.path.join(self.path, INDEX_FILE)
+        meta_path = os.path.join(self.path, META_FILE)
+        policy_path = os.path.join(self.path, POLICY_FILE)
+
+        if os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                sidecar = json.load(f)
+            self.index_type = sidecar.get("index_type", "flat")
+            self.next_id = sidecar["next_id"]
+            if os.path.exists(index_path):
+                # mmapped IVF inverted lists are read-only, so those load into RAM
+                io_flags = (
+                    0 if self.index_type.startswith("ivf") else faiss.IO_FLAG_MMAP
+                )
+                self.index = faiss.read_index(index_path, io_flags)
+                if self.index.metric_type != faiss.METRIC_INNER_PRODUCT:
+                    raise RuntimeError(
+                        f"{index_path} is not a cosine (inner product) index; re-ingest it"
+                    )
+            else:
+                self.index = self._build(self.index_type)
+            if os.path.exists(policy_path):
+                self.policy = np.load(policy_path)
+                self._recode_acls()
+            else:
+                # Indexed before policy codes existed: deny until re-ingested
+                self.policy = np.zeros(self.next_id, dtype=POLICY_DTYPE)
+                self.policy["id"] = np.arange(self.next_id)
+        else:
+            self.index = make_index("flat")
+            self.index_type = "flat"
+            self.policy = np.zeros(0, dtype=POLICY_DTYPE)
+            self.next_id = 0
+        self.saved_id = self.next_id
+        self._replay()
+
+    def _recode_acls(self):
+        """Re-encode empty ACLs: snapshots from before the role registry
+        dropped every role but employee, manager, hr and admin"""
         conn = get_db_connection()
-        cursor = conn.cursor()
-        cls._index = faiss.IndexFlatL2(384)
-        cls._meta = {}  # faiss_id → (user_id, doc_id)
-        embeddings = []
-        for idx, doc in enumerate(docs):
-            emb = scramble_embedding(doc["text"])
-            cursor.execute(
+        for faiss_id in np.flatnonzero(self.policy["acl"] == 0).tolist():
+            row = conn.execute(
                 """
-            INSERT INTO chunks (chunk_id, doc_id, text, embedding, sensitivity, pii_tags)
-            VALUES (?, ?, ?, ?, ?, ?)
+                SELECT d.acl_roles FROM chunks c
+                JOIN documents d ON d.doc_id = c.doc_id
+                WHERE c.org_id = ? AND c.faiss_id = ?
+            """,
+                (self.org_key, faiss_id),
+            ).fetchone()
+            if row and row[0]:
+                self.policy["acl"][faiss_id] = policy_engine.encode_chunk(
+                    faiss_id, 0, json.loads(row[0]), []
+                )[2]
+
+    def _replay(self):
+        """Re-add the vectors written after the last snapshot.
+
+        Chunk rows are inserted before their vectors, and an add that fails
+        is forgotten, so the ids with both are the ones that were indexed.
+        """
+        count = len(self.vectors)
+        if count <= self.next_id:
+            return
+        conn = get_db_connection()
+        rows = conn.execute(
+            """
+            SELECT c.faiss_id, c.sensitivity, c.pii_tags, d.acl_roles
+            FROM chunks c
+            LEFT JOIN documents d ON d.doc_id = c.doc_id
+            WHERE c.org_id = ? AND c.faiss_id >= ? AND c.faiss_id < ?
         """,
-                (
-                    doc["chunk_id"],
-                    doc["doc_id"],
-                    doc["text"],
-                    emb,
-                    doc["sensitivity"],
-                    "",
-                ),
+            (self.org_key, self.next_id, count),
+        ).fetchall()
+        if not rows:
+            return
+        end = max(row[0] for row in rows) + 1
+
+        codes = np.zeros(end - self.next_id, dtype=POLICY_DTYPE)  # Deny by default
+        codes["id"] = np.arange(self.next_id, end)
+        for faiss_id, sensitivity, pii_tags, acl_roles in rows:
+            codes[faiss_id - self.next_id] = policy_engine.encode_chunk(
+                faiss_id,
+                sensitivity,
+                json.loads(acl_roles) if acl_roles else [],
+                json.loads(pii_tags),
             )
-            embeddings.append(emb)
-            cls._meta[len(cls._meta)] = (org_id, user_id, doc["chunk_id"])
+        vectors = self.vectors.load(end)[self.next_id :]
+        self.index.add_with_ids(vectors, codes["id"])
+        self.policy = np.concatenate([self.policy, codes])
+        self.next_id = end
+
+    def save(self):
+        """Snapshot the index, its policy codes and its next id"""
+        os.makedirs(self.path, exist_ok=True)
 
-        embeddings = np.stack(embeddings)
-        cls._index.add(embeddings)
-        conn.commit()
-        conn.close()
+        def write_meta(path):
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({"index_type": self.index_type, "next_id": self.next_id}, f)
+
+        def write_policy(path):
+            with open(path, "wb") as f:
+                np.save(f, self.policy)
+
+        # Index first: a sidecar never references ids missing from the index
+        _write_atomic(
+            os.path.join(self.path, INDEX_FILE),
+            lambda path: faiss.write_index(self.index, path),
+        )
+        _write_atomic(os.path.join(self.path, POLICY_FILE), write_policy)
+        _write_atomic(os.path.join(self.path, META_FILE), write_meta)
+        self.saved_id = self.next_id
+
+    def _build(self, index_type: str) -> faiss.Index:
+        """Build an index from the memory-mapped vector file"""
+        if not self.has_vectors():
+            raise RuntimeError(f"{self.path} has no index and no vectors to rebuild it")
+        vectors = self.vectors.load(self.next_id)
+        index = make_index(index_type, vectors)
+        index.add_with_ids(vectors, np.arange(self.next_id, dtype=np.int64))
+        return index
+
+    def add(self, embeddings: np.ndarray, docs: List[Dict], codes: np.ndarray) -> bool:
+        """Store chunks, their embeddings and policy codes under new faiss ids.
+        Returns False, writing nothing, if the index was evicted meanwhile;
+        add through SafeFAISS.get() again."""
+        with self.lock:
+            if self.evicted:
+                return False
+            ids = np.arange(self.next_id, self.next_id + len(docs), dtype=np.int64)
+            # Without a vector file nothing can be replayed: snapshot every
+            # add, and keep each embedding in its chunk row
+            replayable = self.has_vectors()
+            self._insert_chunks(ids, None if replayable else embeddings, docs)
+            if replayable:
+                os.makedirs(self.path, exist_ok=True)
+                self.vectors.append(embeddings, at=self.next_id)
+            self.index.add_with_ids(embeddings, ids)
+            codes = codes.copy()
+            codes["id"] = ids
+            # Ids only grow, so appending keeps the array sorted
+            self.policy = np.concatenate([self.policy, codes])
+            self.next_id += len(docs)
+            self._selectors.clear()
+
+            promoted = (
+                self.index_type == "flat"
+                and settings.INDEX_TYPE != "flat"
+                and self.index.ntotal >= settings.INDEX_ANN_THRESHOLD
+                and self._promote(settings.INDEX_TYPE)
+            )
+            if (
+                promoted
+                or not replayable
+                or self.next_id - self.saved_id >= settings.INDEX_SAVE_INTERVAL
+            ):
+                self.save()
+        return True
+
+    def _insert_chunks(
+        self, ids: np.ndarray, embeddings: Optional[np.ndarray], docs: List[Dict]
+    ):
+        """Insert chunk rows keyed by (org, faiss id), with their embeddings
+        if given"""
+        if embeddings is None:
+            blobs = [None] * len(docs)
+        else:
+            blobs = [embedding_to_bytes(emb) for emb in embeddings]
+        conn = get_db_connection()
+        with conn:
+            # REPLACE: rows left at these ids by an add that never reached
+            # the index are stale
+            conn.executemany(
+                """
+                INSERT OR REPLACE INTO chunks (
+                    chunk_id, doc_id, org_id, faiss_id, text, embedding, sensitivity, pii_tags
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+                [
+                    (
+                        doc["chunk_id"],
+                        doc["doc_id"],
+                        self.org_key,
+                        faiss_id,
+                        doc["text"],
+                        blob,
+                        doc["sensitivity"],
+                        json.dumps(doc.get("pii_tags", [])),
+                    )
+                    for faiss_id, doc, blob in zip(ids.tolist(), docs, blobs)
+                ],
+            )
+
+    def _promote(self, index_type: str) -> bool:
+        """Rebuild the flat index as an ANN index trained on its own vectors;
+        False if there are too few vectors to train it yet"""
+        ntotal = self.index.ntotal
+        if ntotal < MIN_TRAINING_POINTS.get(index_type, 0):
+            return False
+        if self.has_vectors():
+            self.index = self._build(index_type)
+        else:
+            ids = faiss.vector_to_array(self.index.id_map)
+            vectors = faiss.downcast_index(self.index.index).reconstruct_n(0, ntotal)
+            self.index = make_index(index_type, vectors)
+            self.index.add_with_ids(vectors, ids)
+        self.index_type = index_type
+        return True
+
+    def selector(self, user: Dict, purpose: str) -> faiss.IDSelector:
+        """IDSelector over the vectors a same-org user may see for the purpose.
+
+        The bitmap is computed once per (role, clearance, purpose) and reused
+        until the next add; call with the tenant lock held.
+        """
+        key = (user["role"], user["clearance"], purpose == "dsar")
+        cached = self._selectors.get(key)
+        if cached is None:
+            bits = np.zeros(self.next_id, dtype=bool)
+            bits[
+                self.policy["id"][policy_engine.allowed(self.policy, user, purpose)]
+            ] = True
+            bitmap = np.packbits(bits, bitorder="little")
+            # Keep the bitmap referenced: the selector only holds a pointer
+            cached = (bitmap, faiss.IDSelectorBitmap(bitmap))
+            self._selectors[key] = cached
+        return cached[1]
+
+
+# Authorized hits per (org, access, query, k, threshold, index version);
+# entries of an older index version are never hit again and age out
+result_cache = LRUCache(maxsize=settings.QUERY_RESULT_CACHE_SIZE)
+
+
+# ---- Registry of per-organization FAISS indexes ----
+class SafeFAISS:
+    _tenants: "OrderedDict[str, TenantIndex]" = OrderedDict()
+    _org_locks: Dict[str, threading.Lock] = {}
+    _lock = threading.Lock()
+    _writer_lock = None  # Open lock file while this process owns INDEX_DIR
+
+    @classmethod
+    def lock_writer(cls):
+        """Take the inter-process lock on INDEX_DIR.
+
+        Each process keeps its own copy of the indexes and hands out faiss
+        ids from it, so only one process (the server, or a bulk ingest run
+        while it is down) may write them.
+        """
+        if fcntl is None:
+            print("[!] No fcntl: INDEX_DIR is not locked against other writers")
+            return
+        os.makedirs(settings.INDEX_DIR, exist_ok=True)
+        lock_file = open(os.path.join(settings.INDEX_DIR, WRITER_LOCK_FILE), "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            raise RuntimeError(
+                f"Another process (the server or a bulk ingest) is writing "
+                f"{settings.INDEX_DIR}; stop it first"
+            )
+        cls._writer_lock = lock_file
+
+    @classmethod
+    def unlock_writer(cls):
+        """Release the INDEX_DIR lock taken by lock_writer"""
+        if cls._writer_lock is not None:
+            cls._writer_lock.close()
+            cls._writer_lock = None
+
+    @classmethod
+    def get(cls, org_id: Union[str, int]) -> TenantIndex:
+        """Get an org's index, loading it lazily and evicting the least recently used"""
+        org_key = str(org_id)  # 1 and "1" share an index
+        with cls._lock:
+            tenant = cls._tenants.get(org_key)
+            if tenant is not None:
+                cls._tenants.move_to_end(org_key)
+                return tenant
+            org_lock = cls._org_locks.setdefault(org_key, threading.Lock())
+
+        # Load under the org's lock only, so a slow load (or an add holding
+        # the lock) never blocks lookups of other orgs
+        with org_lock:
+            with cls._lock:
+                tenant = cls._tenants.get(org_key)
+                if tenant is not None:  # Loaded while this thread waited
+                    cls._tenants.move_to_end(org_key)
+                    return tenant
+            tenant = TenantIndex(org_key, org_lock)
+            tenant.load()
+            with cls._lock:
+                cls._tenants[org_key] = tenant
+                cls._evict()
+        return tenant
+
+    @classmethod
+    def preload(cls):
+        """Load the most recently written indexes, up to the cache limits"""
+        if not os.path.isdir(settings.INDEX_DIR):
+            return
+        dirs = [
+            entry
+            for entry in os.scandir(settings.INDEX_DIR)
+            if os.path.exists(os.path.join(entry.path, META_FILE))
+        ]
+        dirs.sort(
+            key=lambda entry: os.path.getmtime(os.path.join(entry.path, META_FILE))
+        )
+        # Oldest first, so the most recent end up most recently used
+        for entry in dirs[-settings.INDEX_CACHE_MAX_TENANTS :]:
+            cls.get(unquote(entry.name))
+
+    @classmethod
+    def save_all(cls):
+        """Snapshot every loaded index with adds since its last snapshot, so
+        the next start has nothing to replay; called on shutdown"""
+        with cls._lock:
+            tenants = list(cls._tenants.values())
+        for tenant in tenants:
+            with tenant.lock:
+                if tenant.next_id != tenant.saved_id:
+                    tenant.save()
+
+    @classmethod
+    def _evict(cls):
+        """Drop least recently used indexes beyond the configured limits.
+
+        Adds are on disk in the chunk rows and vector files, which load()
+        replays, so eviction only releases memory. The most recently used
+        index is always kept.
+        """
+        max_bytes = settings.INDEX_CACHE_MAX_MB * 1024 * 1024
+        while len(cls._tenants) > 1 and (
+            len(cls._tenants) > settings.INDEX_CACHE_MAX_TENANTS
+            or sum(t.nbytes for t in cls._tenants.values()) > max_bytes
+        ):
+            _, tenant = cls._tenants.popitem(last=False)
+            tenant.evicted = True
 
     @classmethod
-    def search(cls, query, k=1, user_id=None):
-        query_emb = np.array([scramble_embedding(query)], dtype="float32")
-        D, indices = cls._index.search(query_emb, k)
-
-        results = []
-        for idx in indices[0]:
-            if idx == -1:
-                continue
-            (
-                org_id,
-                user_id,
-                chunk_id,
-            ) = cls._meta[idx]
-            if user_id is None and org_id == user_id:
-                results.append((user_id, org_id, chunk_id))
-
-        print(cls._meta)
-        return indices, cls._meta
+    def add(
+        cls,
+        docs: List[Dict],
+        user_id: int,
+        org_id: Union[str, int],
+        embeddings: Optional[np.ndarray] = None,
+    ):
+        """Append chunks to the org's index under new faiss ids"""
+        if not docs:
+            return
+
+        if embeddings is None:
+            embeddings = embed_texts([doc["text"] for doc in docs], org_id)
+        # Policy attributes are compiled once here, not on every query
+        codes = np.array(
+            [
+                policy_engine.encode_chunk(
+                    0,
+                    doc["sensitivity"],
+                    doc.get("acl_roles", []),
+                    doc.get("pii_tags", []),
+                )
+                for doc in docs
+            ],
+            dtype=POLICY_DTYPE,
+        )
+
+        while not cls.get(org_id).add(embeddings, docs, codes):
+            pass  # Evicted between get() and add(): retry on the reloaded index
+
+    @classmethod
+    def search(
+        cls,
+        query: str,
+        org_id: Union[str, int],
+        k: Optional[int] = None,
+        threshold: Optional[float] = None,
+        user: Optional[Dict] = None,
+        purpose: str = "general",
+    ) -> List[Dict]:
+        """Search only the org's own vectors for chunks at or above the similarity
+        threshold; returns at most k hits, best first.
+
+        With a user, vectors they may not see for the purpose are filtered out
+        inside FAISS and never scored, so the k hits are the best allowed ones.
+        Results are cached until the org's index changes.
+        """
+        return cls.search_batch([query], org_id, k, threshold, user, purpose)[0]
+
+    @classmethod
+    def search_batch(
+        cls,
+        queries: List[str],
+        org_id: Union[str, int],
+        k: Optional[Union[int, List[int]]] = None,
+        threshold: Optional[float] = None,
+        user: Optional[Dict] = None,
+        purpose: str = "general",
+    ) -> List[List[Dict]]:
+        """search() for many queries of one user and purpose: the uncached
+        queries are embedded in one model call and searched in one FAISS call
+        under one selector. k may be given per query."""
+        ks = k if isinstance(k, list) else [k] * len(queries)
+        ks = [max(1, n or settings.MAX_CHUNKS_PER_QUERY) for n in ks]
+        if threshold is None:
+            threshold = settings.SIMILARITY_THRESHOLD
+
+        tenant = cls.get(org_id)
+        if user is not None and str(user["org_id"]) != tenant.org_key:
+            return [[] for _ in queries]  # Cross-tenant access is never allowed
+
+        access = (user["role"], user["clearance"], purpose == "dsar") if user else None
+        version = tenant.next_id  # Index version: ids only grow, with every add
+        cache_keys = [
+            (tenant.org_key, access, content_hash(query), n, threshold, version)
+            for query, n in zip(queries, ks)
+        ]
+        results: List[Optional[List[Dict]]] = []
+        for cache_key in cache_keys:
+            cached = result_cache.get(cache_key)
+            results.append(None if cached is None else [dict(h) for h in cached])
+        missing = [i for i, hits in enumerate(results) if hits is None]
+        if not missing:
+            return results
+
+        query_embs = embedding_cache.embed_queries(
+            [queries[i] for i in missing], org_id
+        )
+        with tenant.lock:
+            if tenant.index.ntotal == 0:
+                return [hits or [] for hits in results]
+            sel = tenant.selector(user, purpose) if user is not None else None
+            lims, scores, indices = tenant.index.range_search(
+                query_embs, threshold, params=search_params(tenant.index_type, sel)
+            )
+
+        for row, i in enumerate(missing):
+            row_scores = scores[lims[row] : lims[row + 1]]
+            row_indices = indices[lims[row] : lims[row + 1]]
+            order = np.argsort(-row_scores, kind="stable")[: ks[i]]
+            hits = []
+            for faiss_id, score in zip(
+                row_indices[order].tolist(), row_scores[order].tolist()
+            ):
+                hits.append(
+                    {"faiss_id": faiss_id, "org_id": tenant.org_key, "score": score}
+                )
+            result_cache.set(cache_keys[i], [dict(hit) for hit in hits])
+            results[i] = hits
+        return results
@@ -1,6 +1,6 @@
 from typing import Any, Dict, List, Optional, Union
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 # User Models
@@ -36,11 +36,31 @@ class DocumentResponse(BaseModel):
     pii_stats: Dict[str, Any]
 
 
+class IngestJob(BaseModel):
+    job_id: str
+    doc_id: str
+    status: str  # queued, embedding, indexing, completed, failed
+    progress: float
+    chunks_created: int
+    duplicate: bool = False  # Identical document already indexed as doc_id
+    error: Optional[str] = None
+
+
+class BulkIngestJob(BaseModel):
+    job_id: str
+    status: str  # queued, indexing, completed, failed
+    progress: float
+    files_total: Optional[int] = None  # Known once the job starts
+    files_done: int
+    report: Optional[Dict[str, Any]] = None  # Per-file status and throughput
+    error: Optional[str] = None
+
+
 # Query Models
 class QueryRequest(BaseModel):
     query: str
     purpose: str = "general"
-    max_chunks: int = 3
+    max_chunks: int = Field(3, ge=1)
 
 
 class QueryResponse(BaseModel):
@@ -50,6 +70,14 @@ class QueryResponse(BaseModel):
     query_id: str
 
 
+class BatchQueryResult(BaseModel):
+    query_id: str
+    answer: Optional[str] = None
+    citations: List[Dict[str, Any]] = []
+    audit: Dict[str, Any] = {}
+    error: Optional[str] = None  # Why the query has no answer
+
+
 # Audit Models
 class AuditLog(BaseModel):
     query_id: str
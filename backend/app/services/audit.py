@@ -0,0 +1,149 @@
+import queue
+import threading
+import time
+import uuid
+from typing import List, Optional, Tuple
+
+from app.config import settings
+from app.db import get_db_connection
+
+_STOP = object()
+
+
+class AuditBufferFull(Exception):
+    """The audit buffer stayed full for AUDIT_ENQUEUE_TIMEOUT seconds"""
+
+
+class AuditLogWriter:
+    """Write-behind audit log: records are buffered in memory and inserted in
+    bulk, one transaction per batch, from a background thread."""
+
+    def __init__(self):
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        # Records queued or batched but not yet written, bounded by
+        # AUDIT_BUFFER_SIZE however they were grouped when queued
+        self._buffered = 0
+        self._space = threading.Condition()
+
+    def start(self):
+        """Start the background writer"""
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="audit-writer", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        """Flush every buffered record and stop the background writer"""
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+
+    def record(
+        self,
+        query_id: str,
+        user_id,
+        org_id,
+        query: str,
+        decisions: str,
+        allowed_chunks: int,
+        denied_chunks: int,
+    ):
+        """Queue an audit record.
+
+        Blocks while the buffer is full, so producers are slowed to the
+        writer's pace rather than records being dropped; raises
+        AuditBufferFull if it stays full. Call it off the event loop.
+        """
+        self.record_many(
+            [
+                (
+                    query_id,
+                    user_id,
+                    org_id,
+                    query,
+                    decisions,
+                    allowed_chunks,
+                    denied_chunks,
+                )
+            ]
+        )
+
+    def record_many(self, records: List[Tuple]):
+        """Queue the audit records of a batch of queries, each a tuple of
+        record()'s arguments; they are written in the same transaction."""
+        rows = [(str(uuid.uuid4()), *record) for record in records]
+        if self._thread is None:
+            # Writer not running (e.g. outside the app lifespan): write through
+            self._write(rows)
+            return
+
+        with self._space:
+            # A batch larger than the whole buffer gets in once it has drained
+            if not self._space.wait_for(
+                lambda: self._buffered == 0
+                or self._buffered + len(rows) <= settings.AUDIT_BUFFER_SIZE,
+                timeout=settings.AUDIT_ENQUEUE_TIMEOUT,
+            ):
+                raise AuditBufferFull(f"{self._buffered} audit records unwritten")
+            self._buffered += len(rows)
+        self._queue.put(rows)
+
+    def _release(self, count: int):
+        with self._space:
+            self._buffered -= count
+            self._space.notify_all()
+
+    def _run(self):
+        batch: List[Tuple] = []
+        deadline = 0.0
+        stopping = False
+        while not stopping:
+            timeout = max(0.0, deadline - time.monotonic()) if batch else None
+            try:
+                record = self._queue.get(timeout=timeout)
+                if record is _STOP:
+                    stopping = True
+                else:
+                    if not batch:
+                        deadline = (
+                            time.monotonic() + settings.AUDIT_FLUSH_INTERVAL_MS / 1000
+                        )
+                    batch.extend(record)
+            except queue.Empty:
+                pass
+
+            if batch and (
+                stopping
+                or len(batch) >= settings.AUDIT_BATCH_SIZE
+                or time.monotonic() >= deadline
+            ):
+                try:
+                    self._write(batch)
+                    self._release(len(batch))
+                    batch = []
+                except Exception as e:
+                    # Keep the batch and retry on the next flush
+                    print(f"[!] Audit log flush of {len(batch)} records failed: {e}")
+                    deadline = (
+                        time.monotonic() + settings.AUDIT_FLUSH_INTERVAL_MS / 1000
+                    )
+                    if stopping:
+                        self._write(batch)
+
+    def _write(self, records: List[Tuple]):
+        conn = get_db_connection()
+        with conn:
+            conn.executemany(
+                """
+                INSERT INTO audit_logs (
+                    log_id, query_id, user_id, org_id, query, decisions, allowed_chunks, denied_chunks
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                records,
+            )
+
+
+audit_log = AuditLogWriter()
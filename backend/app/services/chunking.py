@@ -0,0 +1,118 @@
+import re
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from app.config import settings
+from app.services.embedding import get_embedding_model
+
+PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def token_budget() -> int:
+    """Text tokens that fit in one chunk, after the model's special tokens"""
+    model = get_embedding_model()
+    max_tokens = min(settings.CHUNK_MAX_TOKENS, model.max_seq_length)
+    return max_tokens - model.tokenizer.num_special_tokens_to_add()
+
+
+def count_tokens(texts: List[str]) -> List[int]:
+    """Token counts, without special tokens, from one tokenizer call"""
+    if not texts:
+        return []
+    input_ids = get_embedding_model().tokenizer(texts, add_special_tokens=False)[
+        "input_ids"
+    ]
+    return [len(ids) for ids in input_ids]
+
+
+def _split_long(sentence: str, run_tokens: int) -> Iterator[Tuple[str, int]]:
+    """Split an overlong sentence into runs of whole words of about run_tokens"""
+    words = sentence.split()
+    run, size = [], 0
+    for word, tokens in zip(words, count_tokens(words)):
+        if run and size + tokens > run_tokens:
+            yield " ".join(run), size
+            run, size = [], 0
+        run.append(word)
+        size += tokens
+    if run:
+        yield " ".join(run), size
+
+
+def _iter_units(
+    pages: Iterable[str], budget: int, overlap: int
+) -> Iterator[Tuple[str, int, bool]]:
+    """Yield (sentence, tokens, starts_paragraph), one page in memory at a time.
+
+    Hard-wrapped lines are rejoined: only blank lines end a paragraph.
+    Sentences over the budget are cut into overlap-sized runs, so chunks of
+    a wall of text still overlap.
+    """
+    for page in pages:
+        for paragraph in PARAGRAPH_BREAK.split(page):
+            paragraph = " ".join(paragraph.split())
+            if not paragraph:
+                continue
+            sentences = SENTENCE_END.split(paragraph)
+            first = True
+            for sentence, tokens in zip(sentences, count_tokens(sentences)):
+                pieces = (
+                    _split_long(sentence, overlap or budget)
+                    if tokens > budget
+                    else [(sentence, tokens)]
+                )
+                for piece, piece_tokens in pieces:
+                    yield piece, piece_tokens, first
+                    first = False
+
+
+def _join(window: List[Tuple[str, int, bool]]) -> str:
+    parts = []
+    for i, (text, _, starts_paragraph) in enumerate(window):
+        if i:
+            parts.append("\n" if starts_paragraph else " ")
+        parts.append(text)
+    return "".join(parts)
+
+
+def iter_chunks(
+    pages: Iterable[str],
+    max_tokens: Optional[int] = None,
+    overlap: Optional[int] = None,
+) -> Iterator[str]:
+    """Pack sentences into chunks of at most max_tokens model tokens.
+
+    Consecutive chunks share up to `overlap` tokens of trailing sentences.
+    Pages are consumed lazily, so a document of any size can be streamed.
+    """
+    budget = max_tokens or token_budget()
+    overlap = settings.CHUNK_OVERLAP_TOKENS if overlap is None else overlap
+
+    window: List[Tuple[str, int, bool]] = []
+    size = 0
+    fresh = 0  # Units in the window not yet emitted in a chunk
+    for unit in _iter_units(pages, budget, overlap):
+        tokens = unit[1]
+        if fresh and size + tokens > budget:
+            yield _join(window)
+            kept, kept_size = [], 0
+            for old in reversed(window):
+                if kept_size + old[1] > overlap:
+                    break
+                kept.insert(0, old)
+                kept_size += old[1]
+            window, size, fresh = kept, kept_size, 0
+        # Drop overlap that would push the next unit over the budget
+        while window and size + tokens > budget:
+            size -= window.pop(0)[1]
+        window.append(unit)
+        size += tokens
+        fresh += 1
+
+    if fresh:
+        yield _join(window)
+
+
+def chunk_text(text: str) -> List[str]:
+    """Split a document into token-bounded, overlapping chunks"""
+    return list(iter_chunks([text]))
@@ -1,22 +1,124 @@
+import os
+import shutil
+import tempfile
+import threading
+from typing import List, Union
+
 import numpy as np
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
 
 from app.config import settings
+from app.services.scramble import scramble_keys
+from app.services.vector_store import decode_embedding, encode_embedding
+
+# torch: the reference PyTorch model; onnx: an ONNX Runtime export of it;
+# onnx_int8: that export with dynamically int8-quantized weights
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx_int8")
+
+_embedding_model = None
+_embedding_model_lock = threading.Lock()
+
+
+def _onnx_dir() -> str:
+    return os.path.join(
+        settings.EMBEDDING_MODEL_DIR, settings.EMBEDDING_MODEL.replace("/", "__")
+    )
+
+
+def _export_atomically(export, dst: str, member: str = ""):
+    """Run export(tmp_dir) in a scratch directory, then rename tmp_dir/member
+    to dst, so concurrent processes never load a half-written export"""
+    os.makedirs(settings.EMBEDDING_MODEL_DIR, exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix=".export-", dir=settings.EMBEDDING_MODEL_DIR)
+    try:
+        export(tmp)
+        try:
+            os.replace(os.path.join(tmp, member) if member else tmp, dst)
+        except OSError:
+            if not os.path.exists(dst):
+                raise  # Otherwise another process's export landed first
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def load_embedding_model(backend: str):
+    """Load the model with the given backend. Every backend is a
+    SentenceTransformer, so encode() and the tokenizer behave the same."""
+    # Imported lazily: importing torch alone takes seconds
+    from sentence_transformers import SentenceTransformer
+
+    if backend == "torch":
+        return SentenceTransformer(settings.EMBEDDING_MODEL)
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend: {backend}")
+
+    # Export once to EMBEDDING_MODEL_DIR, then load the export from there
+    path = _onnx_dir()
+    if not os.path.exists(path):
+        _export_atomically(
+            SentenceTransformer(settings.EMBEDDING_MODEL, backend="onnx").save, path
+        )
+    if backend == "onnx":
+        return SentenceTransformer(path, backend="onnx")
+
+    quantized = os.path.join("onnx", "model_int8.onnx")
+    if not os.path.exists(os.path.join(path, quantized)):
+        from sentence_transformers import export_dynamic_quantized_onnx_model
 
-# Initialize embedding model
-embedding_model = SentenceTransformer(settings.EMBEDDING_MODEL)
+        model = SentenceTransformer(path, backend="onnx")
+        _export_atomically(
+            lambda tmp: export_dynamic_quantized_onnx_model(
+                model, settings.EMBEDDING_QUANTIZATION, tmp, file_suffix="int8"
+            ),
+            os.path.join(path, quantized),
+            member=quantized,
+        )
+    return SentenceTransformer(
+        path, backend="onnx", model_kwargs={"file_name": quantized}
+    )
 
 
-def scramble_embedding(text: str) -> np.ndarray:
+def get_embedding_model():
+    """Get the embedding model of the configured backend, loading it on first use"""
+    global _embedding_model
+    if _embedding_model is None:
+        with _embedding_model_lock:
+            if _embedding_model is None:
+                _embedding_model = load_embedding_model(settings.EMBEDDING_BACKEND)
+    return _embedding_model
+
+
+def embedding_model_id() -> str:
+    """Identifies the vectors the configured model and backend produce"""
+    if settings.EMBEDDING_BACKEND == "torch":
+        return settings.EMBEDDING_MODEL
+    return f"{settings.EMBEDDING_MODEL}@{settings.EMBEDDING_BACKEND}"
+
+
+def scramble_embedding(text: str, org_id: Union[str, int]) -> np.ndarray:
     """Generate scrambled embedding for text"""
-    embedding = embedding_model.encode([text])[0]
-    # scramble_matrix = generate_scramble_matrix(len(embedding))
-    scramble_matrix = np.identity(
-        len(embedding)
-    )  # Use identity matrix for no scrambling
-    print(scramble_matrix)
-    return np.dot(scramble_matrix, embedding)
+    return embed_texts([text], org_id)[0]
+
+
+def encode_texts(texts: List[str], batch_size: int = None, model=None) -> np.ndarray:
+    """Generate unscrambled, L2-normalized embeddings in one encode call,
+    with the configured model unless another is given"""
+    if not texts:
+        return np.empty((0, settings.EMBEDDING_DIM), dtype=np.float32)
+
+    embeddings = (model or get_embedding_model()).encode(
+        texts,
+        batch_size=batch_size or settings.EMBEDDING_BATCH_SIZE,
+        convert_to_numpy=True,
+        normalize_embeddings=True,  # Inner product is then cosine similarity
+    )
+    return np.ascontiguousarray(embeddings, dtype=np.float32)
+
+
+def embed_texts(
+    texts: List[str], org_id: Union[str, int], batch_size: int = None
+) -> np.ndarray:
+    """Generate scrambled, L2-normalized embeddings for many texts in one encode call"""
+    return scramble_keys.scramble(encode_texts(texts, batch_size), org_id)
 
 
 def unscramble_embedding(
@@ -28,21 +130,15 @@ def unscramble_embedding(
 def calculate_similarity(
     query_embedding: np.ndarray, chunk_embedding: np.ndarray
 ) -> float:
-    """Calculate cosine similarity between embeddings"""
-    return cosine_similarity([query_embedding], [chunk_embedding])[0][0]
-
-
-def chunk_text(text: str) -> list:
-    """Simple text chunking by paragraphs"""
-    paragraphs = [p.strip() for p in text.split("\n") if p.strip()]
-    return paragraphs
+    """Calculate cosine similarity between normalized embeddings"""
+    return float(np.dot(query_embedding, chunk_embedding))
 
 
 def embedding_to_bytes(embedding: np.ndarray) -> bytes:
     """Convert embedding to bytes for database storage"""
-    return embedding.tobytes()
+    return encode_embedding(embedding)
 
 
 def bytes_to_embedding(embedding_bytes: bytes) -> np.ndarray:
-    """Convert bytes back to embedding"""
-    return np.frombuffer(embedding_bytes, dtype=np.float32)
+    """Convert bytes back to a float32 embedding"""
+    return decode_embedding(embedding_bytes)
@@ -0,0 +1,159 @@
+import hashlib
+import unicodedata
+from typing import Dict, Iterable, List, Tuple, Union
+
+import numpy as np
+
+from app.config import settings
+from app.db import LOOKUP_BATCH, get_db_connection
+from app.services.chunking import iter_chunks
+from app.services.embedding import embedding_model_id, encode_texts
+from app.services.scramble import scramble_keys
+from app.utils.cache import LRUCache
+
+
+def normalize_text(text: str) -> str:
+    """NFKC-normalize text and collapse its whitespace to single spaces"""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+def content_hash(text: str) -> str:
+    """SHA-256 of text after Unicode and whitespace normalization"""
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Persistent model embeddings keyed by (model id, chunk content hash).
+
+    Vectors are stored before per-org scrambling, so a chunk shared by many
+    documents (or revisions of one) is only ever embedded once per model.
+    """
+
+    def __init__(self, model: str):
+        self.model = model
+        # Recent query embeddings, so a repeated question skips the model
+        self.queries = LRUCache(maxsize=settings.QUERY_EMBEDDING_CACHE_SIZE)
+
+    def get_many(self, hashes: List[str]) -> Dict[str, np.ndarray]:
+        """Look up cached embeddings; misses are absent from the result"""
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        found = {}
+        for start in range(0, len(hashes), LOOKUP_BATCH):
+            batch = hashes[start : start + LOOKUP_BATCH]
+            cursor.execute(
+                f"""
+                SELECT chunk_hash, embedding
+                FROM embedding_cache
+                WHERE model = ? AND chunk_hash IN ({",".join("?" * len(batch))})
+            """,
+                (self.model, *batch),
+            )
+            for chunk_hash, blob in cursor.fetchall():
+                found[chunk_hash] = np.frombuffer(blob, dtype=np.float32)
+        cursor.close()
+        return found
+
+    def put_many(self, hashes: List[str], embeddings: np.ndarray):
+        """Store embeddings, keeping any already cached for the same hash"""
+        conn = get_db_connection()
+        with conn:
+            conn.executemany(
+                """
+                INSERT OR IGNORE INTO embedding_cache (model, chunk_hash, embedding)
+                VALUES (?, ?, ?)
+            """,
+                [
+                    (self.model, chunk_hash, emb.tobytes())
+                    for chunk_hash, emb in zip(hashes, embeddings)
+                ],
+            )
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Unscrambled embeddings for texts, encoding only the uncached ones"""
+        hashes = [content_hash(text) for text in texts]
+        cached = self.get_many(hashes) if settings.EMBEDDING_CACHE_ENABLED else {}
+
+        missing = {}  # hash → text, once per distinct uncached text
+        for chunk_hash, text in zip(hashes, texts):
+            if chunk_hash not in cached:
+                missing.setdefault(chunk_hash, text)
+        if missing:
+            encoded = encode_texts(list(missing.values()))
+            cached.update(zip(missing, encoded))
+            if settings.EMBEDDING_CACHE_ENABLED:
+                self.put_many(list(missing), encoded)
+
+        embeddings = np.empty((len(texts), settings.EMBEDDING_DIM), dtype=np.float32)
+        for i, chunk_hash in enumerate(hashes):
+            embeddings[i] = cached[chunk_hash]
+        return embeddings
+
+    def embed(self, texts: List[str], org_id: Union[str, int]) -> np.ndarray:
+        """Scrambled embeddings for texts, encoding only the uncached ones"""
+        return scramble_keys.scramble(self.encode(texts), org_id)
+
+    def embed_queries(self, queries: List[str], org_id: Union[str, int]) -> np.ndarray:
+        """Scrambled (n, dim) embeddings of queries, cached in memory by their
+        normalized text; the uncached ones are encoded in one model call"""
+        keys = [(self.model, content_hash(query)) for query in queries]
+        found = [self.queries.get(key) for key in keys]
+
+        missing = {}  # key → query, once per distinct uncached query
+        for key, query, embedding in zip(keys, queries, found):
+            if embedding is None:
+                missing.setdefault(key, query)
+        if missing:
+            encoded = dict(zip(missing, encode_texts(list(missing.values()))))
+            for key, embedding in encoded.items():
+                self.queries.set(key, embedding[np.newaxis, :])
+            found = [
+                encoded[key][np.newaxis, :] if embedding is None else embedding
+                for key, embedding in zip(keys, found)
+            ]
+
+        embeddings = (
+            np.vstack(found)
+            if found
+            else np.empty((0, settings.EMBEDDING_DIM), dtype=np.float32)
+        )
+        return scramble_keys.scramble(embeddings, org_id)
+
+
+embedding_cache = EmbeddingCache(embedding_model_id())
+
+
+def _unique_chunks(pages: Iterable[str]) -> List[str]:
+    """Chunks of a document, repeated ones (boilerplate) kept once"""
+    return list({content_hash(chunk): chunk for chunk in iter_chunks(pages)}.values())
+
+
+def chunk_and_embed(
+    pages: Iterable[str], org_id: Union[str, int]
+) -> Tuple[List[str], np.ndarray]:
+    """Chunk and embed a document, given as its pages (or text blocks),
+    inside a worker process. Pages are read as they are chunked.
+
+    Chunks seen before are served from the embedding cache rather than
+    re-encoded.
+    """
+    chunks = _unique_chunks(pages)
+    return chunks, embedding_cache.embed(chunks, org_id)
+
+
+def chunk_and_embed_many(
+    documents: List[Tuple[str, Union[str, int]]]
+) -> List[Tuple[List[str], np.ndarray]]:
+    """Chunk and embed several (content, org_id) documents inside a worker
+    process, encoding all of their uncached chunks in one model call"""
+    chunk_lists = [_unique_chunks([content]) for content, _ in documents]
+    encoded = embedding_cache.encode(
+        [text for chunks in chunk_lists for text in chunks]
+    )
+    offsets = np.cumsum([len(chunks) for chunks in chunk_lists])[:-1]
+    return [
+        (chunks, scramble_keys.scramble(embeddings, org_id))
+        for chunks, embeddings, (_, org_id) in zip(
+            chunk_lists, np.split(encoded, offsets), documents
+        )
+    ]
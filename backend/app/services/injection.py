@@ -0,0 +1,129 @@
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from app.config import settings
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(__file__), "injection_rules.json")
+MAX_LENGTH_RULE = "max_length"
+
+# re.IGNORECASE also matches these to "i", but casefold() keeps them apart
+_DOTTED_I = str.maketrans({"\u0130": "i", "\u0131": "i"})
+
+
+def fold(text: str) -> str:
+    """Case-fold text so a trigger occurs in it whenever the case-insensitive
+    pattern could match (e.g. "\u017f" and the Kelvin sign fold to "s", "k")"""
+    return text.translate(_DOTTED_I).casefold()
+
+
+def _match(compiled, query: str) -> Optional[str]:
+    """Name of the first rule the query trips, or None"""
+    names, prefilter, pattern = compiled
+    if prefilter is not None:
+        folded = fold(query)
+        if not any(trigger in folded for trigger in prefilter):
+            return None
+    match = pattern.search(query)
+    return None if match is None else names[int(match.lastgroup[1:])]
+
+
+def compile_rules(rules: List[Dict]) -> Tuple[List[str], Optional[tuple], re.Pattern]:
+    """Compile every rule into one alternation, each under a named group.
+
+    Returns the rule names, the literal prefilter (None if any rule has no
+    trigger, so the regex must always run) and the compiled pattern. A
+    rule's "examples" must all be detected, or the rules are rejected.
+    """
+    alternation = "|".join(
+        f"(?P<r{i}>{rule['pattern']})" for i, rule in enumerate(rules)
+    )
+    triggers = [rule.get("trigger") for rule in rules]
+    prefilter = (
+        tuple({fold(trigger) for trigger in triggers}) if all(triggers) else None
+    )
+    compiled = (
+        [rule["name"] for rule in rules],
+        prefilter,
+        re.compile(alternation, re.IGNORECASE),
+    )
+    for rule in rules:
+        for example in rule.get("examples", []):
+            if _match(compiled, example) is None:
+                raise ValueError(f"Rule {rule['name']} misses {example!r}")
+    return compiled
+
+
+class InjectionDetector:
+    """Single-pass prompt-injection detector with hot-reloaded rules.
+
+    Rules are loaded from a JSON file ({"rules": [{"name", "trigger",
+    "pattern", "examples"}]}) and compiled into one regex, so a query is
+    scanned once however many rules there are. A rule's trigger is a literal
+    that every match contains, compared case-folded; when no trigger occurs
+    in the query, the regex is skipped. Queries longer than
+    INJECTION_MAX_QUERY_LENGTH are rejected outright, which bounds the cost
+    of any pathological input.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or settings.INJECTION_RULES_PATH or DEFAULT_RULES_PATH
+        self._compiled = None  # compile_rules() result, swapped as one reference
+        self._mtime = 0.0
+        self._checked_at = 0.0
+        self._hits: Counter = Counter()
+        self._lock = threading.Lock()
+        self.reload()
+
+    def reload(self):
+        """Reload the rules file; a broken file keeps the previous rules"""
+        mtime = os.path.getmtime(self.path)
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                rules = json.load(f)["rules"]
+            compiled = compile_rules(rules)
+        except (ValueError, KeyError, re.error) as e:
+            if self._compiled is None:
+                raise
+            print(f"[!] Keeping previous injection rules, {self.path} is invalid: {e}")
+        else:
+            self._compiled = compiled
+        self._mtime = mtime
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._checked_at < settings.INJECTION_RULES_RELOAD_INTERVAL:
+            return
+        self._checked_at = now
+        try:
+            if os.path.getmtime(self.path) != self._mtime:
+                self.reload()
+        except OSError as e:
+            print(f"[!] Cannot check injection rules {self.path}: {e}")
+
+    def detect(self, query: str) -> Optional[str]:
+        """Return the name of the first rule the query trips, or None"""
+        self._maybe_reload()
+
+        if len(query) > settings.INJECTION_MAX_QUERY_LENGTH:
+            rule = MAX_LENGTH_RULE
+        else:
+            rule = _match(self._compiled, query)
+            if rule is None:
+                return None
+
+        with self._lock:
+            self._hits[rule] += 1
+        return rule
+
+    def stats(self) -> Dict[str, int]:
+        """Per-rule hit counts since startup"""
+        with self._lock:
+            return dict(self._hits)
+
+
+injection_detector = InjectionDetector()
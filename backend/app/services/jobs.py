@@ -0,0 +1,271 @@
+import asyncio
+import multiprocessing
+import shutil
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Set, Tuple
+
+from app.bulk_ingest import BulkIngest, count_sources, iter_sources
+from app.config import settings
+from app.db import claim_documents, forget_documents, mark_documents_indexed
+from app.safe_faiss import SafeFAISS
+from app.schemas.base import DocumentIngest
+from app.services.embedding_cache import chunk_and_embed_many, content_hash
+
+FINISHED_STATES = ("completed", "failed")
+
+
+class IngestQueue:
+    """Background ingest jobs: embedding runs in worker processes and
+    indexing in a thread, so the event loop keeps serving queries."""
+
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._workers: List[asyncio.Task] = []
+        self._jobs: "OrderedDict[str, Dict]" = OrderedDict()
+        # doc_id → future resolved when that document's ingest ends either way
+        self._ingesting: Dict[str, asyncio.Future] = {}
+        # Jobs waiting on an identical document before they are queued again
+        self._deferred: Set[asyncio.Task] = set()
+
+    async def start(self):
+        """Start the process pool and the queue consumers"""
+        self._queue = asyncio.Queue()
+        self._pool = ProcessPoolExecutor(
+            max_workers=settings.INGEST_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        self._workers = [
+            asyncio.create_task(self._consume()) for _ in range(settings.INGEST_WORKERS)
+        ]
+
+    async def stop(self):
+        """Drain queued jobs, then stop the consumers and the process pool"""
+        if self._queue is None:
+            return
+        await self._queue.join()
+        while self._deferred:
+            await asyncio.gather(*self._deferred)
+            await self._queue.join()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._pool.shutdown()
+        self._queue = None
+        self._pool = None
+        self._workers = []
+
+    def submit(self, doc: DocumentIngest) -> Dict:
+        """Queue a document for ingestion and return its job record"""
+        job = {
+            "job_id": str(uuid.uuid4()),
+            "doc_id": str(uuid.uuid4()),
+            "status": "queued",
+            "progress": 0.0,
+            "chunks_created": 0,
+            "duplicate": False,
+            "error": None,
+        }
+        self._jobs[job["job_id"]] = job
+        self._trim_history()
+        self._queue.put_nowait((job, doc))
+        return job
+
+    def submit_bulk(
+        self, path: str, org_id, sensitivity: int, acl_roles: List[str], workdir: str
+    ) -> Dict:
+        """Queue a directory, archive or NDJSON file for bulk ingestion.
+
+        workdir holds the uploaded files and is removed once the job ends.
+        """
+        job = {
+            "job_id": str(uuid.uuid4()),
+            "kind": "bulk",
+            "status": "queued",
+            "progress": 0.0,
+            "files_total": None,  # Counted once the job starts
+            "files_done": 0,
+            "report": None,
+            "error": None,
+        }
+        self._jobs[job["job_id"]] = job
+        self._trim_history()
+        self._queue.put_nowait((job, (path, org_id, sensitivity, acl_roles, workdir)))
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Look up a job record by id"""
+        return self._jobs.get(job_id)
+
+    def _trim_history(self):
+        """Forget the oldest finished jobs beyond INGEST_JOB_HISTORY"""
+        for job_id in list(self._jobs):
+            if len(self._jobs) <= settings.INGEST_JOB_HISTORY:
+                break
+            if self._jobs[job_id]["status"] in FINISHED_STATES:
+                del self._jobs[job_id]
+
+    async def _consume(self):
+        while True:
+            items = [await self._queue.get()]
+            # Take the documents already waiting too, to embed them together
+            while len(items) < settings.INGEST_BATCH_DOCS and not self._queue.empty():
+                items.append(self._queue.get_nowait())
+            try:
+                documents = [item for item in items if item[0].get("kind") != "bulk"]
+                if documents:
+                    try:
+                        await self._process_documents(documents)
+                    except Exception as e:
+                        for job, _ in documents:
+                            if job["status"] not in FINISHED_STATES:
+                                job.update(status="failed", error=str(e))
+                for job, payload in items:
+                    if job.get("kind") == "bulk":
+                        try:
+                            await self._process_bulk(job, payload)
+                        except Exception as e:
+                            job.update(status="failed", error=str(e))
+            finally:
+                for _ in items:
+                    self._queue.task_done()
+
+    async def _claim(self, job: Dict, doc: DocumentIngest, user_id):
+        """Claim a document for ingest: True when this job must index it,
+        False when it completed as a duplicate, or the future of the
+        identical document still being indexed"""
+        loop = asyncio.get_running_loop()
+        (existing,) = await loop.run_in_executor(
+            None,
+            claim_documents,
+            [
+                (
+                    job["doc_id"],
+                    doc.org_id,
+                    user_id,
+                    doc.title,
+                    doc.sensitivity,
+                    doc.acl_roles,
+                    content_hash(doc.content),
+                )
+            ],
+        )
+        if existing is None:
+            self._ingesting[job["doc_id"]] = loop.create_future()
+            return True
+        ingesting = self._ingesting.get(existing)
+        if ingesting is None:
+            job.update(
+                status="completed", progress=1.0, doc_id=existing, duplicate=True
+            )
+            return False
+        return ingesting
+
+    def _requeue_after(self, ingesting: asyncio.Future, job: Dict, doc: DocumentIngest):
+        """Queue the job again once the identical document's ingest ends,
+        since a failed ingest forgets it and this one must then run"""
+
+        async def requeue():
+            await ingesting
+            self._queue.put_nowait((job, doc))
+
+        task = asyncio.create_task(requeue())
+        self._deferred.add(task)
+        task.add_done_callback(self._deferred.discard)
+
+    async def _process_documents(self, items: List[Tuple[Dict, DocumentIngest]]):
+        """Ingest queued documents, encoding all their chunks in one pool call"""
+        loop = asyncio.get_running_loop()
+        user_id = 101  # Demo user until ingest is authenticated
+
+        claimed = []
+        for job, doc in items:
+            try:
+                outcome = await self._claim(job, doc, user_id)
+            except Exception as e:
+                job.update(status="failed", error=str(e))
+                continue
+            if outcome is True:
+                claimed.append((job, doc))
+            elif outcome is not False:
+                self._requeue_after(outcome, job, doc)
+        if not claimed:
+            return
+
+        try:
+            for job, _ in claimed:
+                job.update(status="embedding", progress=0.25)
+            try:
+                embedded = await loop.run_in_executor(
+                    self._pool,
+                    chunk_and_embed_many,
+                    [(doc.content, doc.org_id) for _, doc in claimed],
+                )
+            except Exception as e:
+                for job, _ in claimed:
+                    await loop.run_in_executor(None, forget_documents, [job["doc_id"]])
+                    job.update(status="failed", error=str(e))
+                return
+
+            for (job, doc), (texts, embeddings) in zip(claimed, embedded):
+                job.update(status="indexing", progress=0.75)
+                chunks = [
+                    {
+                        "chunk_id": str(uuid.uuid4()),
+                        "doc_id": job["doc_id"],
+                        "org_id": doc.org_id,
+                        "text": text,
+                        "sensitivity": doc.sensitivity,
+                        "acl_roles": doc.acl_roles,
+                    }
+                    for text in texts
+                ]
+                try:
+                    await loop.run_in_executor(
+                        None, SafeFAISS.add, chunks, user_id, doc.org_id, embeddings
+                    )
+                    await loop.run_in_executor(
+                        None, mark_documents_indexed, [job["doc_id"]]
+                    )
+                except Exception as e:
+                    await loop.run_in_executor(None, forget_documents, [job["doc_id"]])
+                    job.update(status="failed", error=str(e))
+                else:
+                    job.update(
+                        status="completed", progress=1.0, chunks_created=len(chunks)
+                    )
+        finally:
+            for job, _ in claimed:
+                self._ingesting.pop(job["doc_id"]).set_result(None)
+
+    async def _process_bulk(self, job: Dict, payload):
+        loop = asyncio.get_running_loop()
+        path, org_id, sensitivity, acl_roles, workdir = payload
+        bulk = BulkIngest(org_id, 101, sensitivity, acl_roles)  # Demo user
+
+        def on_progress(bulk: BulkIngest):
+            job.update(
+                files_done=bulk.processed,
+                progress=bulk.processed / max(job["files_total"], 1),
+            )
+
+        try:
+            # Counting reads NDJSON and compressed archives in full
+            files_total = await loop.run_in_executor(None, count_sources, path)
+            job.update(status="indexing", files_total=files_total)
+            report = await loop.run_in_executor(
+                None,
+                bulk.run,
+                iter_sources(path),
+                self._pool,
+                settings.INGEST_WORKERS,
+                on_progress,
+            )
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        job.update(status="completed", progress=1.0, report=report)
+
+
+ingest_queue = IngestQueue()
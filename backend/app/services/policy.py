@@ -0,0 +1,200 @@
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+
+from app.db import get_db_connection
+
+# Per-chunk policy codes, stored alongside each tenant's vector index
+POLICY_DTYPE = np.dtype(
+    [("id", np.int64), ("level", np.uint8), ("acl", np.uint64), ("pii", np.uint64)]
+)
+
+CLEARANCE_HIERARCHY = {"employee": 0, "manager": 1, "hr": 2, "admin": 3}
+SENSITIVITY_LEVELS = ["public", "internal", "confidential", "restricted", "unknown"]
+SENSITIVITY_REQUIREMENTS = {
+    "public": 0,
+    "internal": 0,
+    "confidential": 1,
+    "restricted": 2,
+}
+SENSITIVITY_BASE_SCORES = {"public": 0.0, "confidential": 0.4, "restricted": 0.8}
+PII_TAGS = ["ssn", "salary", "email", "phone", "address", "account_number", "dob"]
+
+# Bit 63 stands for any PII tag outside PII_TAGS, and for a user role no ACL
+# has named yet; ACLs never set it for a named role, so only an "all" ACL
+# admits such users
+OTHER_BIT = 63
+ALL_BITS = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+ALLOW, CROSS_TENANT, CLEARANCE, SSN, SALARY, ACL = range(6)
+
+
+def _bits(names: Iterable[str], vocabulary: List[str], other: bool) -> int:
+    mask = 0
+    for name in names:
+        if name in vocabulary:
+            mask |= 1 << vocabulary.index(name)
+        elif other:
+            mask |= 1 << OTHER_BIT
+    return mask
+
+
+class PolicyEngine:
+    """Access policies compiled to lookup tables and bitmasks.
+
+    Chunks are encoded once at ingest (encode_chunk), so authorizing a
+    whole candidate set is a handful of NumPy operations over their codes.
+    """
+
+    def __init__(self):
+        self.level_codes = {name: i for i, name in enumerate(SENSITIVITY_LEVELS)}
+        self.required = np.array(
+            [SENSITIVITY_REQUIREMENTS.get(name, 0) for name in SENSITIVITY_LEVELS]
+        )
+        self.base_scores = np.array(
+            [SENSITIVITY_BASE_SCORES.get(name, 0.5) for name in SENSITIVITY_LEVELS]
+        )
+        self.ssn_bit = np.uint64(1 << PII_TAGS.index("ssn"))
+        self.salary_bit = np.uint64(1 << PII_TAGS.index("salary"))
+        self.pii_bits = np.array([1 << i for i in range(64)], dtype=np.uint64)
+        self._role_bits: Optional[Dict[str, int]] = None  # Loaded on first use
+        self._roles_lock = threading.Lock()
+
+    def _load_role_bits(self) -> Dict[str, int]:
+        with self._roles_lock:
+            if self._role_bits is None:
+                rows = get_db_connection().execute("SELECT role, bit FROM acl_roles")
+                self._role_bits = dict(rows.fetchall())
+        return self._role_bits
+
+    def role_bit(self, role: str, register: bool = False) -> Optional[int]:
+        """The ACL bit of a role, registering a role no ACL has named before
+        if asked to; None for an unregistered role"""
+        role_bits = self._role_bits or self._load_role_bits()
+        bit = role_bits.get(role)
+        if bit is not None or not register:
+            return bit
+        with self._roles_lock:
+            if role not in role_bits:
+                bit = max(role_bits.values(), default=-1) + 1
+                if bit >= OTHER_BIT:
+                    raise ValueError(
+                        f"Cannot add ACL role {role!r}: all {OTHER_BIT} role bits are taken"
+                    )
+                conn = get_db_connection()
+                with conn:
+                    conn.execute(
+                        "INSERT INTO acl_roles (role, bit) VALUES (?, ?)", (role, bit)
+                    )
+                role_bits[role] = bit
+            return role_bits[role]
+
+    def sensitivity_level(self, sensitivity: Union[str, int]) -> int:
+        """Encode a sensitivity label, or a 1-10 upload slider value (the
+        chunks table stores it as text, e.g. "8")"""
+        if isinstance(sensitivity, str) and sensitivity.strip().isdigit():
+            sensitivity = int(sensitivity)
+        if isinstance(sensitivity, (int, float)):
+            # Same bands as the upload page: Public, Confidential, Restricted
+            if sensitivity <= 3:
+                return self.level_codes["public"]
+            if sensitivity <= 7:
+                return self.level_codes["confidential"]
+            return self.level_codes["restricted"]
+        return self.level_codes.get(
+            str(sensitivity).lower(), self.level_codes["unknown"]
+        )
+
+    def encode_chunk(
+        self,
+        faiss_id: int,
+        sensitivity: Union[str, int],
+        acl_roles: Iterable[str],
+        pii_tags: Iterable[str],
+    ) -> Tuple:
+        """Encode one chunk's policy attributes as a POLICY_DTYPE row"""
+        acl_roles = list(acl_roles)
+        if "all" in acl_roles:
+            acl = int(ALL_BITS)
+        else:
+            acl = 0
+            for role in acl_roles:
+                acl |= 1 << self.role_bit(role, register=True)
+        return (
+            faiss_id,
+            self.sensitivity_level(sensitivity),
+            acl,
+            _bits(pii_tags, PII_TAGS, True),
+        )
+
+    def acl_roles(self, acl: int) -> List[str]:
+        """Decode an ACL bitmask back to role names"""
+        if acl == int(ALL_BITS):
+            return ["all"]
+        role_bits = self._role_bits or self._load_role_bits()
+        return [
+            role
+            for role, bit in sorted(role_bits.items(), key=lambda item: item[1])
+            if acl & (1 << bit)
+        ]
+
+    def _reason_codes(
+        self, codes: np.ndarray, user_data: Dict, purpose: str, same_org: bool
+    ) -> np.ndarray:
+        n = len(codes)
+        user_clearance = CLEARANCE_HIERARCHY.get(user_data["clearance"], 0)
+        role = user_data["role"]
+        bit = self.role_bit(role)
+        role_bit = np.uint64(1 << (OTHER_BIT if bit is None else bit))
+
+        # First matching policy wins, in the same order as check_policy
+        return np.select(
+            [
+                np.full(n, not same_org),
+                self.required[codes["level"]] > user_clearance,
+                ((codes["pii"] & self.ssn_bit) != 0) & (purpose != "dsar"),
+                ((codes["pii"] & self.salary_bit) != 0) & (role not in ["hr", "admin"]),
+                (codes["acl"] & role_bit) == 0,
+            ],
+            [CROSS_TENANT, CLEARANCE, SSN, SALARY, ACL],
+            default=ALLOW,
+        )
+
+    def allowed(
+        self, codes: np.ndarray, user_data: Dict, purpose: str, same_org: bool = True
+    ) -> np.ndarray:
+        """Boolean mask of the chunks the user may see, without reasons"""
+        return self._reason_codes(codes, user_data, purpose, same_org) == ALLOW
+
+    def authorize(
+        self, codes: np.ndarray, user_data: Dict, purpose: str, same_org: bool = True
+    ) -> Tuple[np.ndarray, List[str]]:
+        """Authorize a candidate set in one pass; returns (allowed, reasons)"""
+        role = user_data["role"]
+        reason_codes = self._reason_codes(codes, user_data, purpose, same_org)
+
+        messages = {
+            ALLOW: "policy check passed",
+            CROSS_TENANT: "cross-tenant access not allowed",
+            CLEARANCE: f"insufficient clearance: {user_data['clearance']} < required level",
+            SSN: "SSN access requires DSAR purpose",
+            SALARY: "salary information requires HR/admin role",
+        }
+        reasons = [
+            (
+                messages[code]
+                if code != ACL
+                else f"role {role} not in ACL: {self.acl_roles(int(acl))}"
+            )
+            for code, acl in zip(reason_codes.tolist(), codes["acl"].tolist())
+        ]
+        return reason_codes == ALLOW, reasons
+
+    def sensitivity_scores(self, codes: np.ndarray) -> np.ndarray:
+        """Sensitivity score per chunk: level base score plus 0.2 per PII tag"""
+        pii_counts = ((codes["pii"][:, None] & self.pii_bits) != 0).sum(axis=1)
+        return np.minimum(1.0, self.base_scores[codes["level"]] + 0.2 * pii_counts)
+
+
+policy_engine = PolicyEngine()
@@ -1,29 +1,120 @@
-import sqlite3
+from typing import Dict, List, Optional, Tuple
 
+from app.config import settings
+from app.db import LOOKUP_BATCH, get_db_connection
+from app.safe_faiss import SafeFAISS
+from app.services.embedding_cache import content_hash
 
-def fetch_docs(db_path="docs.db"):
-    conn = sqlite3.connect(db_path)
+# Hits searched per citation returned: a chunk repeated across documents
+# (boilerplate, unchanged paragraphs of a revision) has a vector per
+# document, and its copies are collapsed into one citation
+_OVERFETCH = 4
+
+
+def _fetch_chunks(org_id, faiss_ids: List[int]) -> Dict[int, tuple]:
+    """faiss id → (faiss_id, chunk_id, doc_id, text, sensitivity, title) for one org"""
+    conn = get_db_connection()
     cursor = conn.cursor()
+    rows = {}
+    for start in range(0, len(faiss_ids), LOOKUP_BATCH):
+        batch = faiss_ids[start : start + LOOKUP_BATCH]
+        cursor.execute(
+            f"""
+            SELECT c.faiss_id, c.chunk_id, c.doc_id, c.text, c.sensitivity, d.title
+            FROM chunks c
+            LEFT JOIN documents d ON d.doc_id = c.doc_id
+            WHERE c.org_id = ? AND c.faiss_id IN ({",".join("?" * len(batch))})
+        """,
+            [str(org_id), *batch],
+        )
+        rows.update((row[0], row) for row in cursor.fetchall())
+    cursor.close()
+    return rows
 
-    # Grab salary_data (structured) -> flatten row into string
-    cursor.execute(
-        "SELECT id, Name, UserID, Department, MonthlySalary, AccountNumber FROM salary_data"
-    )
-    salary_rows = cursor.fetchall()
 
-    salary_docs = [
-        (
-            row[0],
-            f"Employee {row[1]}, SSN {row[2]}, Dept {row[3]}, Salary {row[4]}, Acc {row[5]}",
+def _citations(hits: List[Dict], rows: Dict[int, tuple], limit: int):
+    """The first `limit` hits with distinct text, as ranked citations"""
+    citations, seen = [], set()
+    for hit in hits:
+        if len(citations) == limit:
+            break
+        row = rows.get(hit["faiss_id"])
+        if row is None:
+            continue  # Indexed, but its chunk row is gone
+        digest = content_hash(row[3])
+        if digest in seen:
+            continue  # A lower-ranked copy of a chunk already cited
+        seen.add(digest)
+        citations.append(
+            {
+                "rank": len(citations) + 1,
+                "chunk_id": row[1],
+                "doc_id": row[2],
+                "title": row[5],
+                "text": row[3],
+                "sensitivity": row[4],
+                "score": hit["score"],
+            }
         )
-        for row in salary_rows
-    ]
+    return citations
 
-    # Grab unstructured docs
-    cursor.execute("SELECT id, name, content FROM documents")
-    doc_rows = cursor.fetchall()
 
-    text_docs = [(row[0], row[2]) for row in doc_rows]
+def hydrate(hits: List[Dict], limit: int) -> List[Dict]:
+    """Turn ranked search hits of one org into at most `limit` citations
+    with one database round trip, looking chunks up by their faiss id"""
+    if not hits:
+        return []
+    rows = _fetch_chunks(hits[0]["org_id"], [hit["faiss_id"] for hit in hits])
+    return _citations(hits, rows, limit)
+
+
+def _chunk_limit(max_chunks: Optional[int]) -> int:
+    # At least 1: a negative k would slice from the end and lift the cap
+    return max(
+        1,
+        min(max_chunks or settings.MAX_CHUNKS_PER_QUERY, settings.MAX_CHUNKS_PER_QUERY),
+    )
+
 
-    conn.close()
-    return text_docs
+def retrieve(
+    query: str, user: Dict, purpose: str = "general", max_chunks: Optional[int] = None
+) -> List[Dict]:
+    """Retrieve up to max_chunks (capped by MAX_CHUNKS_PER_QUERY) chunks the
+    user may see, best first, as citations"""
+    k = _chunk_limit(max_chunks)
+    hits = SafeFAISS.search(
+        query, org_id=user["org_id"], k=k * _OVERFETCH, user=user, purpose=purpose
+    )
+    return hydrate(hits, k)
+
+
+def retrieve_batch(
+    queries: List[Tuple[str, str, Optional[int]]], user: Dict
+) -> List[List[Dict]]:
+    """retrieve() for many (query, purpose, max_chunks) at once, in order.
+
+    Queries sharing a purpose are embedded and searched together, and every
+    hit is hydrated in one pass over the chunks table.
+    """
+    by_purpose: Dict[str, List[int]] = {}
+    for i, (_, purpose, _) in enumerate(queries):
+        by_purpose.setdefault(purpose, []).append(i)
+
+    hits: List[List[Dict]] = [[] for _ in queries]
+    for purpose, indices in by_purpose.items():
+        found = SafeFAISS.search_batch(
+            [queries[i][0] for i in indices],
+            org_id=user["org_id"],
+            k=[_chunk_limit(queries[i][2]) * _OVERFETCH for i in indices],
+            user=user,
+            purpose=purpose,
+        )
+        for i, query_hits in zip(indices, found):
+            hits[i] = query_hits
+
+    faiss_ids = sorted({hit["faiss_id"] for query_hits in hits for hit in query_hits})
+    rows = _fetch_chunks(user["org_id"], faiss_ids) if faiss_ids else {}
+    return [
+        _citations(query_hits, rows, _chunk_limit(max_chunks))
+        for query_hits, (_, _, max_chunks) in zip(hits, queries)
+    ]
@@ -0,0 +1,46 @@
+import hashlib
+import hmac
+import threading
+from typing import Dict, Union
+
+import numpy as np
+
+from app.config import settings
+from app.utils.helpers import generate_rotation_matrix
+
+
+class ScrambleKeyStore:
+    """Per-organization rotation matrices, derived from SCRAMBLE_SECRET and
+    cached in memory so each org's key is generated only once."""
+
+    def __init__(self):
+        self._keys: Dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    def get(self, org_id: Union[str, int]) -> np.ndarray:
+        """Get the float32 rotation matrix for an organization"""
+        org_key = str(org_id)
+        matrix = self._keys.get(org_key)
+        if matrix is None:
+            with self._lock:
+                matrix = self._keys.get(org_key)
+                if matrix is None:
+                    digest = hmac.new(
+                        settings.SCRAMBLE_SECRET.encode(),
+                        org_key.encode(),
+                        hashlib.sha256,
+                    ).digest()
+                    matrix = generate_rotation_matrix(
+                        settings.EMBEDDING_DIM, int.from_bytes(digest[:8], "big")
+                    )
+                    self._keys[org_key] = matrix
+        return matrix
+
+    def scramble(self, embeddings: np.ndarray, org_id: Union[str, int]) -> np.ndarray:
+        """Rotate a batch of row embeddings with the organization's key"""
+        if not settings.SCRAMBLE_ENABLED:
+            return embeddings
+        return np.ascontiguousarray(embeddings @ self.get(org_id).T)
+
+
+scramble_keys = ScrambleKeyStore()
@@ -1,32 +1,49 @@
+import threading
+
 from cryptography.hazmat.primitives import serialization
 from cryptography.hazmat.primitives.asymmetric import dh
 
-# Step 1: Generate some DH parameters (shared by all parties)
-parameters = dh.generate_parameters(generator=2, key_size=2048)
+_parameters = None
+_parameters_lock = threading.Lock()
+
+
+def get_dh_parameters() -> dh.DHParameters:
+    """Get the DH parameters shared by all parties, generating them on first use"""
+    global _parameters
+    if _parameters is None:
+        with _parameters_lock:
+            if _parameters is None:
+                # Generating 2048-bit parameters takes seconds to minutes
+                _parameters = dh.generate_parameters(generator=2, key_size=2048)
+    return _parameters
+
+
+def public_key_pem(public_key: dh.DHPublicKey) -> bytes:
+    """Serialize a public key to send it over the wire"""
+    return public_key.public_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo,
+    )
+
 
-# Step 2: Generate Alice's private and public key
-alice_private_key = parameters.generate_private_key()
-alice_public_key = alice_private_key.public_key()
+if __name__ == "__main__":
+    # Step 1: Generate some DH parameters (shared by all parties)
+    parameters = get_dh_parameters()
 
-# Step 3: Generate Bob's private and public key
-bob_private_key = parameters.generate_private_key()
-bob_public_key = bob_private_key.public_key()
+    # Step 2: Generate Alice's private and public key
+    alice_private_key = parameters.generate_private_key()
+    alice_public_key = alice_private_key.public_key()
 
-# Step 4: Each side computes the shared secret
-alice_shared_key = alice_private_key.exchange(bob_public_key)
-bob_shared_key = bob_private_key.exchange(alice_public_key)
+    # Step 3: Generate Bob's private and public key
+    bob_private_key = parameters.generate_private_key()
+    bob_public_key = bob_private_key.public_key()
 
-print("Alice and Bob keys match?", alice_shared_key == bob_shared_key)
+    # Step 4: Each side computes the shared secret
+    alice_shared_key = alice_private_key.exchange(bob_public_key)
+    bob_shared_key = bob_private_key.exchange(alice_public_key)
 
-# Step 5: (Optional) Serialize public keys if you want to send them over the wire
-alice_pub_bytes = alice_public_key.public_bytes(
-    encoding=serialization.Encoding.PEM,
-    format=serialization.PublicFormat.SubjectPublicKeyInfo,
-)
-bob_pub_bytes = bob_public_key.public_bytes(
-    encoding=serialization.Encoding.PEM,
-    format=serialization.PublicFormat.SubjectPublicKeyInfo,
-)
+    print("Alice and Bob keys match?", alice_shared_key == bob_shared_key)
 
-print("Alice Public Key:\n", alice_pub_bytes.decode())
-print("Bob Public Key:\n", bob_pub_bytes.decode())
+    # Step 5: Serialize public keys to send them over the wire
+    print("Alice Public Key:\n", public_key_pem(alice_public_key).decode())
+    print("Bob Public Key:\n", public_key_pem(bob_public_key).decode())
@@ -0,0 +1,139 @@
+import os
+import struct
+from typing import Optional
+
+import numpy as np
+
+from app.config import settings
+
+# Every stored vector (and vector file) starts with this header, so the
+# element type and dimension are never guessed from the byte length
+MAGIC = b"SVEC"
+VERSION = 1
+_HEADER = struct.Struct("<4sBBH")  # magic, version, dtype code, dimension
+STORE_DTYPES = {"float32": 1, "float16": 2, "int8": 3}
+_DTYPE_NAMES = {code: name for name, code in STORE_DTYPES.items()}
+
+
+def row_dtype(dtype_name: str, dim: int) -> np.dtype:
+    """On-disk layout of one vector; int8 rows carry their own scale"""
+    if dtype_name == "int8":
+        return np.dtype([("scale", "<f4"), ("vec", "i1", (dim,))])
+    if dtype_name in ("float32", "float16"):
+        return np.dtype([("vec", "<f4" if dtype_name == "float32" else "<f2", (dim,))])
+    raise ValueError(f"Unknown embedding store dtype: {dtype_name}")
+
+
+def quantize(embeddings: np.ndarray, dtype_name: str) -> np.ndarray:
+    """Convert a float32 matrix to rows of the store dtype"""
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    rows = np.empty(len(embeddings), dtype=row_dtype(dtype_name, embeddings.shape[1]))
+    if dtype_name == "int8":
+        scale = np.abs(embeddings).max(axis=1) / 127
+        scale[scale == 0] = 1.0
+        rows["scale"] = scale
+        rows["vec"] = np.round(embeddings / scale[:, None])
+    else:
+        rows["vec"] = embeddings
+    return rows
+
+
+def dequantize(rows: np.ndarray) -> np.ndarray:
+    """Convert stored rows back to a float32 matrix (no copy for float32)"""
+    if "scale" in rows.dtype.names:
+        return rows["vec"].astype(np.float32) * rows["scale"][:, None]
+    vectors = rows["vec"]
+    return vectors if vectors.dtype == np.float32 else vectors.astype(np.float32)
+
+
+def _header(dtype_name: str, dim: int) -> bytes:
+    return _HEADER.pack(MAGIC, VERSION, STORE_DTYPES[dtype_name], dim)
+
+
+def _parse_header(data: bytes):
+    magic, version, code, dim = _HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION or code not in _DTYPE_NAMES:
+        raise ValueError("Unrecognized embedding header")
+    return _DTYPE_NAMES[code], dim
+
+
+def encode_embedding(embedding: np.ndarray, dtype_name: Optional[str] = None) -> bytes:
+    """Serialize one embedding with a version header"""
+    dtype_name = dtype_name or settings.EMBEDDING_STORE_DTYPE
+    embedding = np.asarray(embedding, dtype=np.float32)
+    rows = quantize(embedding[np.newaxis, :], dtype_name)
+    return _header(dtype_name, len(embedding)) + rows.tobytes()
+
+
+def decode_embedding(data: bytes) -> np.ndarray:
+    """Deserialize an embedding written by encode_embedding.
+
+    Headerless blobs from before the typed store are raw float32, or
+    float64 from the old scrambled path, told apart by their length.
+    """
+    if data[:4] != MAGIC:
+        legacy = np.float64 if len(data) == settings.EMBEDDING_DIM * 8 else np.float32
+        return np.frombuffer(data, dtype=legacy).astype(np.float32)
+    dtype_name, dim = _parse_header(data)
+    rows = np.frombuffer(data, dtype=row_dtype(dtype_name, dim), offset=_HEADER.size)
+    return dequantize(rows)[0]
+
+
+class VectorFile:
+    """Append-only file of one tenant's vectors, row i holding faiss id i.
+
+    Loading memory-maps the rows, so rebuilding or warming an index needs
+    no per-row decoding; float32 rows are used in place.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def __len__(self) -> int:
+        if not self.exists():
+            return 0
+        with open(self.path, "rb") as f:
+            dtype_name, dim = _parse_header(f.read(_HEADER.size))
+        size = os.path.getsize(self.path) - _HEADER.size
+        return size // row_dtype(dtype_name, dim).itemsize
+
+    def append(self, embeddings: np.ndarray, at: int):
+        """Write vectors as rows at, at+1, ...; rows past `at` left by an
+        interrupted write are dropped first. A new file takes the configured
+        store dtype."""
+        if self.exists():
+            with open(self.path, "rb") as f:
+                dtype_name, dim = _parse_header(f.read(_HEADER.size))
+            header = b""
+        else:
+            dtype_name = settings.EMBEDDING_STORE_DTYPE
+            dim = embeddings.shape[1]
+            header = _header(dtype_name, dim)
+        if embeddings.shape[1] != dim:
+            raise ValueError(f"{self.path} holds {dim}-d vectors")
+
+        with open(self.path, "ab") as f:
+            if not header:
+                f.truncate(_HEADER.size + at * row_dtype(dtype_name, dim).itemsize)
+            f.write(header)
+            f.write(quantize(embeddings, dtype_name).tobytes())
+
+    def load(self, count: Optional[int] = None) -> np.ndarray:
+        """Memory-map the first count vectors (all by default) as float32"""
+        with open(self.path, "rb") as f:
+            dtype_name, dim = _parse_header(f.read(_HEADER.size))
+        dtype = row_dtype(dtype_name, dim)
+        available = len(self)
+        if count is None:
+            count = available
+        elif count > available:
+            raise ValueError(f"{self.path} holds {available} of {count} vectors")
+        if count == 0:
+            return np.empty((0, dim), dtype=np.float32)
+        rows = np.memmap(
+            self.path, dtype=dtype, mode="r", offset=_HEADER.size, shape=(count,)
+        )
+        return dequantize(rows)
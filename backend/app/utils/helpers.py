@@ -7,3 +7,12 @@ def generate_scramble_matrix(dim: int) -> np.ndarray:
     while np.linalg.det(matrix) == 0:
         matrix = np.random.randn(dim, dim)
     return matrix
+
+
+def generate_rotation_matrix(dim: int, seed: int) -> np.ndarray:
+    """Generate a random orthogonal matrix for distance-preserving scrambling"""
+    rng = np.random.default_rng(seed)
+    q, r = np.linalg.qr(rng.standard_normal((dim, dim)))
+    # Sign fix makes q uniformly distributed over orthogonal matrices
+    q *= np.sign(np.diag(r))
+    return q.astype(np.float32)
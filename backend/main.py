@@ -1,15 +1,51 @@
+import asyncio
 from contextlib import asynccontextmanager
 
-from app.db import init_db
+from app.db import close_db_connections, init_db, user_cache
 from app.routes.endpoints import auth, documents
+from app.safe_faiss import SafeFAISS, result_cache
+from app.services.audit import AuditBufferFull, audit_log
+from app.services.embedding import embed_texts
+from app.services.embedding_cache import embedding_cache
+from app.services.injection import injection_detector
+from app.services.jobs import ingest_queue
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+
+# "starting" until warm_up() finishes, then "ready" (or "failed")
+readiness = {"status": "starting", "error": None}
+
+
+def warm_up():
+    """Load the embedding model and the recently used indexes"""
+    embed_texts(["warm-up"], org_id=0)  # First encode also initializes the model
+    SafeFAISS.preload()
+
+
+async def _run_warm_up():
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, warm_up)
+        readiness["status"] = "ready"
+        print("Warm-up complete, ready to serve queries")
+    except Exception as e:
+        readiness.update(status="failed", error=str(e))
+        print(f"[!] Warm-up failed: {e}")
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    SafeFAISS.lock_writer()  # Refuses to start while a bulk ingest runs
     print("Initializing database and demo data...")
     init_db()
+    audit_log.start()
+
+    print("Starting ingest workers...")
+    await ingest_queue.start()
+
+    # Warm up in the background so the port binds immediately
+    print("Warming up embedding model and indexes...")
+    warm_up_task = asyncio.create_task(_run_warm_up())
 
     # Create demo data
     # conn = get_db_connection()
@@ -41,6 +77,13 @@ async def lifespan(app: FastAPI):
 
     yield
 
+    warm_up_task.cancel()
+    await ingest_queue.stop()
+    SafeFAISS.save_all()
+    SafeFAISS.unlock_writer()
+    audit_log.stop()
+    close_db_connections()
+
     # conn.commit()
     # conn.close()
 
@@ -58,6 +101,16 @@ app.include_router(documents.router, prefix="/documents", tags=["documents"])
 # app.include_router(audit.router, prefix="/audit", tags=["audit"])
 
 
+@app.exception_handler(AuditBufferFull)
+async def audit_buffer_full(request, exc: AuditBufferFull):
+    """Shed load while audit writes lag, rather than answer unaudited"""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Audit log is behind, retry shortly"},
+        headers={"Retry-After": "1"},
+    )
+
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # React frontend
@@ -87,6 +140,23 @@ async def health_check():
     return {"status": "healthy", "version": "1.0.0"}
 
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe: 503 until the model and indexes are warm"""
+    status_code = 200 if readiness["status"] == "ready" else 503
+    return JSONResponse(status_code=status_code, content=readiness)
+
+
+@app.get("/metrics")
+async def metrics():
+    return {
+        "user_cache": user_cache.stats(),
+        "query_embedding_cache": embedding_cache.queries.stats(),
+        "query_result_cache": result_cache.stats(),
+        "injection_rule_hits": injection_detector.stats(),
+    }
+
+
 if __name__ == "__main__":
     import uvicorn
 
@@ -14,6 +14,15 @@ const dummyData = [
   { type: "Text", content: "Node.js event loop explained", privacy: "Confidential", date: "2024-03-18" },
 ];
 
+// Same bands as the upload page's privacy slider
+const sensitivityLabel = (value) => {
+  const level = Number(value);
+  if (Number.isNaN(level)) return value;
+  if (level <= 3) return "Public";
+  if (level <= 7) return "Confidential";
+  return "Restricted";
+};
+
 const privacyOptions = [
   { value: "Public", label: "Public" },
   { value: "Confidential", label: "Confidential" },
@@ -123,6 +132,30 @@ function SearchPage() {
     }
   };
 
+  // Parse a Server-Sent Events body, calling onEvent(name, data) per event
+  const readEvents = async (res, onEvent) => {
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    for (;;) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      let sep;
+      while ((sep = buffer.indexOf("\n\n")) !== -1) {
+        const frame = buffer.slice(0, sep);
+        buffer = buffer.slice(sep + 2);
+        let event = "message";
+        let data = "";
+        frame.split("\n").forEach((line) => {
+          if (line.startsWith("event: ")) event = line.slice(7);
+          else if (line.startsWith("data: ")) data += line.slice(6);
+        });
+        onEvent(event, data ? JSON.parse(data) : null);
+      }
+    }
+  };
+
   const onSearchClick = async () => {
     if (inputQuery.trim() === "") {
       setHasSearched(false);
@@ -132,8 +165,9 @@ function SearchPage() {
 
     try {
       setError(""); // reset error
+      setResults([]);
       const token = localStorage.getItem("token");
-      const res = await fetch("http://localhost:8003/documents/query", {
+      const res = await fetch("http://localhost:8003/documents/query/stream", {
         method: "POST",
         headers: {
           "Content-Type": "application/json",
@@ -151,21 +185,27 @@ function SearchPage() {
         throw new Error(errText || "Query failed");
       }
 
-      const data = await res.json();
-      console.log("Backend results:", data);
-
       setHasSearched(true);
       setPage(1);
 
-      // Map backend answer to UI format
-      setResults([
-        {
-          type: "Answer",
-          content: data.answer || "No answer returned",
-          privacy: "Backend",
-          date: new Date().toISOString().split("T")[0],
-        },
-      ]);
+      // Show each citation (ranked, best first) as soon as it arrives
+      const today = new Date().toISOString().split("T")[0];
+      await readEvents(res, (event, data) => {
+        if (event === "citation") {
+          setResults((prev) => [
+            ...prev,
+            {
+              type: `#${data.rank} ${data.title || "Document"} (score ${data.score.toFixed(2)})`,
+              content: data.text,
+              privacy: sensitivityLabel(data.sensitivity),
+              date: today,
+            },
+          ]);
+        } else if (event === "done") {
+          console.log("Query audit:", data);
+          if (data.audit.allowed_chunks === 0) setError("No matching documents");
+        }
+      });
     } catch (err) {
       console.error("Search error:", err);
       setError(err.message || "An unexpected error occurred");
@@ -73,6 +73,23 @@ function UploadPage() {
 
   const fillPercentage = ((sliderValue - 1) / 9) * 100;
 
+  // Poll the ingest job until the backend has indexed the document
+  const waitForIngestJob = async (jobId, token) => {
+    while (true) {
+      const res = await fetch(`http://localhost:8003/documents/jobs/${jobId}`, {
+        headers: { Authorization: `Bearer ${token}` },
+      });
+      if (!res.ok) {
+        throw new Error(`Job status failed: ${res.status}`);
+      }
+      const job = await res.json();
+      setUploadProgress(Math.round(job.progress * 100));
+      if (job.status === "completed") return job;
+      if (job.status === "failed") throw new Error(job.error || "ingestion failed");
+      await new Promise((resolve) => setTimeout(resolve, 500));
+    }
+  };
+
   // Fixed simulateUpload function
   const simulateUpload = async () => {
     if (files.length === 0 && !textInput.trim()) {
@@ -114,33 +131,25 @@ function UploadPage() {
         throw new Error(`Upload failed: ${response.status} - ${errorData.detail || response.statusText}`);
       }
 
-      const data = await response.json();
-
-      // Simulate upload animation
-      let progress = 0;
-      const interval = setInterval(() => {
-        progress += 20;
-        setUploadProgress(progress);
-        if (progress >= 100) {
-          clearInterval(interval);
-          setUploading(false);
-          setReceipts((prev) => [
-            ...prev,
-            {
-              timestamp: new Date().toLocaleString(),
-              files: files.length > 0 ? files.map((f) => f.name) : ["Text input"],
-              sliderValue,
-              scrambled: true,
-              docId: data.doc_id,
-              chunks: data.chunks_created,
-            },
-          ]);
-          setFiles([]);
-          setTextInput("");
-          alert("Upload and ingestion complete!");
-          setUploadProgress(0);
-        }
-      }, 200);
+      const job = await response.json();
+      const data = await waitForIngestJob(job.job_id, token);
+
+      setUploading(false);
+      setReceipts((prev) => [
+        ...prev,
+        {
+          timestamp: new Date().toLocaleString(),
+          files: files.length > 0 ? files.map((f) => f.name) : ["Text input"],
+          sliderValue,
+          scrambled: true,
+          docId: data.doc_id,
+          chunks: data.chunks_created,
+        },
+      ]);
+      setFiles([]);
+      setTextInput("");
+      alert("Upload and ingestion complete!");
+      setUploadProgress(0);
     } catch (err) {
       console.error(err);
       setErrorMsg("Upload failed: " + err.message);